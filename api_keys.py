@@ -0,0 +1,141 @@
+"""Long-lived API keys for machine clients.
+
+A key looks like `zl_<prefix>_<secret>`. The prefix is stored in clear and
+indexed; the whole key is stored only as an HMAC-SHA256 under API_KEY_SECRET,
+so checking a key is one indexed lookup plus a constant-time digest compare,
+with no bcrypt involved.
+"""
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+import config
+from database import fetch_one
+from models import ApiKeys, Users
+
+API_KEY_MARKER = 'zl_'
+PREFIX_BYTES = 6
+SECRET_BYTES = 24
+
+
+class ApiKeyCache:
+    """Bounded LRU cache of prefix -> (key_hash, user claims) with a per-entry TTL.
+
+    Revoking a key or deactivating its user invalidates the prefix and bumps
+    `generation`; a lookup that started before that passes the generation it saw to
+    `set`, which then drops the row instead of caching a key that is no longer live.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.generation = 0
+        self.stale_sets = 0
+
+    def get(self, prefix: str):
+        with self._lock:
+            entry = self._data.get(prefix)
+            if entry is None:
+                self.misses += 1
+                return None
+            key_hash, claims, expires = entry
+            if expires < time.monotonic():
+                del self._data[prefix]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(prefix)
+            self.hits += 1
+            return key_hash, dict(claims)
+
+    def set(self, prefix: str, key_hash: str, claims: dict, generation: int):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                self.stale_sets += 1
+                return
+            self._data[prefix] = (key_hash, dict(claims), time.monotonic() + self.ttl)
+            self._data.move_to_end(prefix)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *prefixes: str):
+        with self._lock:
+            self.generation += 1
+            for prefix in prefixes:
+                self._data.pop(prefix, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'stale_sets': self.stale_sets,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+api_key_cache = ApiKeyCache(config.API_KEY_CACHE_SIZE, config.API_KEY_CACHE_TTL)
+
+
+def generate_api_key():
+    """Return (key, prefix) for a new key; only the caller ever sees the full key."""
+    prefix = secrets.token_hex(PREFIX_BYTES)
+    return f'{API_KEY_MARKER}{prefix}_{secrets.token_urlsafe(SECRET_BYTES)}', prefix
+
+
+def hash_api_key(key: str) -> str:
+    return hmac.new(config.API_KEY_SECRET.encode(), key.encode(), hashlib.sha256).hexdigest()
+
+
+def is_api_key(token: str) -> bool:
+    return token.startswith(API_KEY_MARKER)
+
+
+def key_prefix(key: str):
+    parts = key[len(API_KEY_MARKER):].split('_', 1)
+    if len(parts) != 2 or len(parts[0]) != PREFIX_BYTES * 2:
+        return None
+    return parts[0]
+
+
+async def authenticate_api_key(key: str):
+    """Return get_current_user-style claims for a live key, or None."""
+    prefix = key_prefix(key)
+    if prefix is None:
+        return None
+    entry = api_key_cache.get(prefix)
+    if entry is None:
+        # Read before the lookup, so a revocation that lands meanwhile keeps the row out of the cache
+        generation = api_key_cache.generation
+        row = await fetch_one(select(ApiKeys.key_hash, Users.id, Users.username, Users.role)
+                              .join(Users, Users.id == ApiKeys.user_id)
+                              .where(ApiKeys.prefix == prefix, ApiKeys.revoked_at.is_(None),
+                                     Users.is_active.isnot(False)))
+        if row is None:
+            return None
+        entry = (row.key_hash, {'username': row.username, 'id': row.id, 'role': row.role})
+        api_key_cache.set(prefix, *entry, generation)
+    key_hash, claims = entry
+    if not hmac.compare_digest(key_hash, hash_api_key(key)):
+        return None
+    return dict(claims)
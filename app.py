@@ -5,6 +5,7 @@ import plotly.graph_objects as go
 import pandas as pd
 from datetime import datetime, timedelta
 import json
+from urllib.parse import quote
 
 # Page Configuration
 st.set_page_config(
@@ -258,6 +259,32 @@ def make_api_request(endpoint, method='GET', data=None, auth_required=True):
         return None
 
 
+def fetch_page(endpoint, state_key, limit=20):
+    """Fetch the current page of a keyset-paginated list endpoint"""
+    cursors = st.session_state.setdefault(f"{state_key}_cursors", [None])
+    separator = '&' if '?' in endpoint else '?'
+    query = f"{endpoint}{separator}limit={limit}"
+    if cursors[-1]:
+        query += f"&cursor={cursors[-1]}"
+    return make_api_request(query)
+
+
+def render_pager(state_key, next_cursor):
+    """Render Previous/Next buttons that walk the cursor stack of a paginated list"""
+    cursors = st.session_state.setdefault(f"{state_key}_cursors", [None])
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if len(cursors) > 1 and st.button("← Previous", key=f"{state_key}_prev", use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if next_cursor and st.button("Next →", key=f"{state_key}_next", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+
+
 # Authentication Functions
 def login_user(username, password):
     """Authenticate user and get JWT token"""
@@ -611,17 +638,17 @@ def render_dashboard():
     st.markdown("# Dashboard")
     st.markdown("Welcome to your URL management dashboard")
 
-    # Get user URLs for metrics
-    response = make_api_request('/urls/')
+    # Totals are aggregated server-side
+    response = make_api_request('/urls/summary')
     urls_count = 0
     total_clicks = 0
     active_urls = 0
 
     if response and response.status_code == 200:
-        urls = response.json()
-        urls_count = len(urls)
-        total_clicks = sum(url.get('access_count', 0) for url in urls)
-        active_urls = len([url for url in urls if url.get('access_count', 0) > 0])
+        summary = response.json()
+        urls_count = summary['total_urls']
+        total_clicks = summary['total_clicks']
+        active_urls = summary['active_urls']
 
     # Metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -642,9 +669,10 @@ def render_dashboard():
     # Recent Activity
     st.markdown("## Recent Activity")
 
-    if response and response.status_code == 200 and urls:
+    recent_response = make_api_request('/urls/?sort=created_at&limit=5')
+    recent_urls = recent_response.json()['items'] if recent_response and recent_response.status_code == 200 else []
+    if recent_urls:
         # Show recent URLs
-        recent_urls = sorted(urls, key=lambda x: x.get('created_at', ''), reverse=True)[:5]
         for url_data in recent_urls:
             render_url_item(url_data)
     else:
@@ -688,10 +716,21 @@ def render_url_management():
     # URL List
     st.markdown("## Your URLs")
 
-    # Get user URLs
-    response = make_api_request('/urls/')
+    search_query = st.text_input("Search", placeholder="Short code, domain or path words", key="url_search_query").strip()
+    if search_query:
+        # A new query starts again from its first page
+        if st.session_state.get('url_search_last') != search_query:
+            st.session_state.url_search_last = search_query
+            st.session_state.url_search_cursors = [None]
+        list_key = 'url_search'
+        response = fetch_page(f"/urls/search?q={quote(search_query)}", list_key)
+    else:
+        # Get the current page of user URLs
+        list_key = 'my_urls'
+        response = fetch_page('/urls/', list_key)
     if response and response.status_code == 200:
-        urls = response.json()
+        page = response.json()
+        urls = page['items']
 
         if urls:
             for url_data in urls:
@@ -752,6 +791,9 @@ def render_url_management():
                                 st.rerun()
                             else:
                                 render_error_alert("Failed to delete URL")
+            render_pager(list_key, page['next_cursor'])
+        elif search_query:
+            render_info_card("No Matches", f"None of your URLs match \"{search_query}\".")
         else:
             render_info_card("No URLs Found", "You haven't created any short URLs yet. Create your first one above!")
     elif response and response.status_code == 401:
@@ -768,21 +810,18 @@ def render_analytics():
     st.markdown("# Analytics")
     st.markdown("Detailed insights into your URL performance")
 
-    # Get user URLs for analytics
-    response = make_api_request('/urls/')
+    # Totals and top links are aggregated server-side
+    response = make_api_request('/urls/summary')
     if response and response.status_code == 200:
-        urls = response.json()
-
-        if urls:
-            # Create analytics data
-            df_urls = pd.DataFrame(urls)
+        summary = response.json()
 
+        if summary['total_urls']:
             # Top URLs chart
             col1, col2 = st.columns(2)
 
             with col1:
                 st.markdown("## Top Performing URLs")
-                top_urls = df_urls.nlargest(5, 'access_count')[['short_code', 'access_count']]
+                top_urls = pd.DataFrame(summary['top'])
                 if not top_urls.empty and top_urls['access_count'].sum() > 0:
                     fig = px.bar(
                         top_urls,
@@ -802,13 +841,46 @@ def render_analytics():
 
             with col2:
                 st.markdown("## URL Statistics")
-                total_urls = len(urls)
-                total_clicks = df_urls['access_count'].sum()
-                active_urls = len(df_urls[df_urls['access_count'] > 0])
+                render_metric_card("Total URLs", str(summary['total_urls']))
+                render_metric_card("Total Clicks", str(summary['total_clicks']))
+                render_metric_card("Active URLs", str(summary['active_urls']))
 
-                render_metric_card("Total URLs", str(total_urls))
-                render_metric_card("Total Clicks", str(total_clicks))
-                render_metric_card("Active URLs", str(active_urls))
+            # Click history from the server-side hourly/daily rollups
+            st.markdown("## Clicks Over Time")
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                # The selector offers the most clicked links rather than the whole list
+                codes_response = make_api_request('/urls/?sort=access_count&limit=100')
+                codes = [url['short_code'] for url in codes_response.json()['items']] \
+                    if codes_response and codes_response.status_code == 200 else []
+                selected_code = st.selectbox("Short URL", codes, key="stats_short_code")
+            with col2:
+                granularity = st.radio("Granularity", ['hour', 'day'], horizontal=True, key="stats_granularity")
+
+            stats_response = make_api_request(f"/urls/{selected_code}/stats?granularity={granularity}")
+            if stats_response and stats_response.status_code == 200:
+                stats = stats_response.json()
+                if stats['series']:
+                    df_series = pd.DataFrame(stats['series'])
+                    df_series['bucket_start'] = pd.to_datetime(df_series['bucket_start'])
+                    fig = px.line(
+                        df_series,
+                        x='bucket_start',
+                        y='clicks',
+                        markers=True,
+                        title=f"Clicks per {granularity} for /{selected_code}"
+                    )
+                    fig.update_layout(
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font_color=COLORS['dark'],
+                        xaxis_title=None
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+                else:
+                    st.info("No clicks recorded in this period.")
+            else:
+                render_error_alert("Failed to fetch click history.")
         else:
             render_info_card("No Data Available", "Create some URLs first to see analytics.")
     else:
@@ -880,9 +952,9 @@ def render_admin_panel():
     st.markdown("# System Administration")
     st.markdown("Manage users and system settings")
 
-    # Get admin data using all 4 endpoints
-    users_response = make_api_request('/admin/users')
-    urls_response = make_api_request('/admin/urls')
+    # Get the current page of each admin list
+    users_response = fetch_page('/admin/users', 'admin_users')
+    urls_response = fetch_page('/admin/urls', 'admin_urls')
 
     # System Metrics
     st.markdown("## System Overview")
@@ -891,11 +963,11 @@ def render_admin_panel():
     total_users = 0
     total_urls = 0
 
-    if users_response and users_response.status_code == 200:
-        total_users = len(users_response.json())
-
-    if urls_response and urls_response.status_code == 200:
-        total_urls = len(urls_response.json())
+    summary_response = make_api_request('/admin/summary')
+    if summary_response and summary_response.status_code == 200:
+        summary = summary_response.json()
+        total_users = summary['total_users']
+        total_urls = summary['urls']['total_urls']
 
     with col1:
         render_metric_card("Total Users", str(total_users))
@@ -909,6 +981,33 @@ def render_admin_panel():
     with col4:
         render_metric_card("API Version", "v1.0", "Latest")
 
+    # Trending links from the server's sliding-window heavy hitters
+    st.markdown("## Trending Now")
+    window = st.radio("Window", ['5m', '15m', '1h'], horizontal=True, key="trending_window")
+    trending_response = make_api_request(f"/admin/trending?window={window}&k=10")
+    if trending_response and trending_response.status_code == 200:
+        trending = trending_response.json()['items']
+        if trending:
+            df_trending = pd.DataFrame(trending)
+            fig = px.bar(
+                df_trending,
+                x='clicks',
+                y='short_code',
+                orientation='h',
+                title=f'Most clicked links, last {window}'
+            )
+            fig.update_layout(
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font_color=COLORS['dark'],
+                yaxis={'categoryorder': 'total ascending'}
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info("No redirects in this window yet.")
+    else:
+        render_error_alert("Failed to fetch trending links.")
+
     # Tabs for different admin functions
     tab1, tab2 = st.tabs(["User Management", "URL Management"])
 
@@ -916,7 +1015,8 @@ def render_admin_panel():
         st.markdown("## User Management")
 
         if users_response and users_response.status_code == 200:
-            users = users_response.json()
+            users_page = users_response.json()
+            users = users_page['items']
 
             if users:
                 for user in users:
@@ -936,8 +1036,8 @@ def render_admin_panel():
                                 if st.button("✅ Confirm", key=f"confirm_del_user_{user_id}", type="primary"):
                                     # Delete user using admin endpoint
                                     del_response = make_api_request(f"/admin/users/{user_id}", method='DELETE')
-                                    if del_response and del_response.status_code == 200:
-                                        render_success_alert(f"User {username} deleted successfully")
+                                    if del_response and del_response.status_code == 202:
+                                        render_success_alert(f"Deleting user {username} in the background (job {del_response.json()['job_id']})")
                                         st.session_state.confirm_delete_user = None
                                         st.rerun()
                                     else:
@@ -951,6 +1051,7 @@ def render_admin_panel():
                             if st.button("🗑️ Delete", key=f"delete_user_{user_id}", type="secondary"):
                                 st.session_state.confirm_delete_user = user_id
                                 st.rerun()
+                render_pager('admin_users', users_page['next_cursor'])
             else:
                 render_info_card("No Users", "No users found in the system.")
         else:
@@ -960,7 +1061,8 @@ def render_admin_panel():
         st.markdown("## URL Management")
 
         if urls_response and urls_response.status_code == 200:
-            urls = urls_response.json()
+            urls_page = urls_response.json()
+            urls = urls_page['items']
 
             if urls:
                 for url in urls:
@@ -995,6 +1097,7 @@ def render_admin_panel():
                             if st.button("🗑️ Delete", key=f"delete_url_{short_code}", type="secondary"):
                                 st.session_state.confirm_delete_url = short_code
                                 st.rerun()
+                render_pager('admin_urls', urls_page['next_cursor'])
             else:
                 render_info_card("No URLs", "No URLs found in the system.")
         else:
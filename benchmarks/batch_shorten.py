@@ -0,0 +1,57 @@
+"""Throughput of POST /urls/batch against the same number of POST /urls/ calls.
+
+Run from the project root:  python benchmarks/batch_shorten.py [links]
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{workdir}/bench.db'
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+os.environ.setdefault('ALGORITHM', 'HS256')
+
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+def login(client):
+    client.post('/auth/', json={'email': 'bench@example.com', 'username': 'bench', 'firstname': 'b',
+                                'lastname': 'b', 'password': 'benchmark', 'role': 'user'})
+    response = client.post('/auth/token', data={'username': 'bench', 'password': 'benchmark'})
+    return {'Authorization': f"Bearer {response.json()['access_token']}"}
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with TestClient(app) as client:
+        headers = login(client)
+
+        start = time.perf_counter()
+        for i in range(links):
+            client.post('/urls/', json={'long_url': f'https://single.example.com/{i}'}, headers=headers)
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post('/urls/batch', headers=headers,
+                               json={'long_urls': [f'https://batch.example.com/{i}' for i in range(links)]})
+        batch = time.perf_counter() - start
+        assert response.json()['created'] == links
+
+        start = time.perf_counter()
+        client.post('/urls/batch', headers=headers,
+                    json={'long_urls': [f'https://batch.example.com/{i}' for i in range(links)]})
+        rerun = time.perf_counter() - start
+
+    print(f'{links} links')
+    print(f'{links} x POST /urls/       {single:8.3f} s  {links / single:10,.0f} links/s')
+    print(f'1 x POST /urls/batch       {batch:8.3f} s  {links / batch:10,.0f} links/s')
+    print(f'batch again (all existing) {rerun:8.3f} s  {links / rerun:10,.0f} links/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Create latency (dedupe lookup + insert + commit) as the urls table grows.
+
+Compares the old full-scan dedupe on urls.url with the (owner_id, url_hash) index.
+Run from the project root:  python benchmarks/dedupe_lookup.py [max_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select
+
+from models import Base, Urls
+from url_utils import hash_url
+
+OWNERS = 1000
+SAMPLES = 50
+SIZES = (10_000, 100_000, 1_000_000, 5_000_000)
+
+
+def fill(engine, start, stop):
+    step = 50_000
+    for offset in range(start, stop, step):
+        rows = [{'url': f'https://example.com/page/{i}', 'url_hash': hash_url(f'https://example.com/page/{i}'),
+                 'short_code': f'r{i}', 'access_count': 0, 'owner_id': i % OWNERS}
+                for i in range(offset, min(offset + step, stop))]
+        with engine.begin() as conn:
+            conn.execute(insert(Urls), rows)
+
+
+def create(engine, long_url, owner_id, indexed, seq):
+    with engine.begin() as conn:
+        if indexed:
+            url_hash = hash_url(long_url)
+            found = conn.execute(select(Urls.id).where(Urls.owner_id == owner_id, Urls.url_hash == url_hash)).first()
+        else:
+            url_hash = None
+            # owner_id + 0 keeps SQLite off the new index, reproducing the pre-index scan
+            found = conn.execute(select(Urls.id).where(Urls.url == long_url, Urls.owner_id + 0 == owner_id)).first()
+        if found is None:
+            conn.execute(insert(Urls).values(url=long_url, url_hash=url_hash, short_code=f'n{seq}',
+                                             access_count=0, owner_id=owner_id))
+
+
+def measure(engine, indexed, size, samples):
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        create(engine, f'https://new.example.com/{size}/{indexed}/{i}', i % OWNERS, indexed, f'{size}-{int(indexed)}-{i}')
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{tmp}/bench.db')
+        Base.metadata.create_all(bind=engine)
+        print(f'{"rows":>10} {"url scan (ms)":>14} {"url_hash index (ms)":>20}')
+        filled = 0
+        for size in SIZES:
+            if size > max_rows:
+                break
+            fill(engine, filled, size)
+            filled = size
+            scan = measure(engine, False, size, max(5, SAMPLES * 10_000 // size))
+            indexed = measure(engine, True, size, SAMPLES)
+            print(f'{size:>10,} {scan:>14.3f} {indexed:>20.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Peak Python memory of the streaming urls export as the table grows.
+
+Compares stream_rows (keyset pages of EXPORT_BATCH_SIZE rows) with building the
+whole list first, as the unpaginated admin listing did. Run from the project root:
+    python benchmarks/export_memory.py [max_rows]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{TMP}/bench.db'
+
+from sqlalchemy import insert, select
+
+from database import engine
+from exports import stream_rows
+from models import Base, Urls
+
+SIZES = (10_000, 100_000, 500_000)
+COLUMNS = [column for column in Urls.__table__.columns if column.name != 'visitor_sketch']
+
+
+def fill(start, stop):
+    step = 50_000
+    for offset in range(start, stop, step):
+        rows = [{'url': f'https://example.com/page/{i}', 'short_code': f'r{i}', 'access_count': i % 100, 'owner_id': i % 1000}
+                for i in range(offset, min(offset + step, stop))]
+        with engine.begin() as conn:
+            conn.execute(insert(Urls), rows)
+
+
+def peak(fn):
+    tracemalloc.start()
+    size = fn()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak_bytes / 2**20, size
+
+
+def streamed(fmt):
+    return lambda: sum(len(chunk) for chunk in stream_rows(select(*COLUMNS), Urls.id, fmt))
+
+
+def materialised():
+    with engine.connect() as conn:
+        rows = [dict(row._mapping) for row in conn.execute(select(*COLUMNS))]
+    return len(rows)
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    Base.metadata.create_all(bind=engine)
+    print(f'{"rows":>10} {"list (MiB)":>11} {"ndjson (MiB)":>13} {"csv (MiB)":>10}')
+    filled = 0
+    for size in SIZES:
+        if size > max_rows:
+            break
+        fill(filled, size)
+        filled = size
+        listed, _ = peak(materialised)
+        ndjson, _ = peak(streamed('ndjson'))
+        csv_peak, _ = peak(streamed('csv'))
+        print(f'{size:>10,} {listed:>11.1f} {ndjson:>13.1f} {csv_peak:>10.1f}')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
@@ -0,0 +1,52 @@
+"""Accuracy, sketch size and throughput of the unique-visitor HyperLogLog.
+
+Run from the project root:  python benchmarks/hyperloglog_accuracy.py [visitors]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hyperloglog import HyperLogLog, visitor_hash
+
+
+def main():
+    visitors = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(42)
+    hashes = [visitor_hash(f'10.{rng.randrange(256)}.{i >> 8 & 255}.{i & 255}', f'agent-{i}') for i in range(visitors)]
+    exact_set_bytes = sys.getsizeof(set(hashes))
+
+    print(f'{visitors:,} distinct visitors (exact Python set: {exact_set_bytes / 2 ** 20:.1f} MiB)')
+    print(f'{"precision":>9} {"estimate":>12} {"error":>8} {"expected":>9} {"blob":>8} {"adds/s":>12}')
+    for precision in (10, 12, 14):
+        sketch = HyperLogLog(precision)
+        start = time.perf_counter()
+        for hashed in hashes:
+            sketch.add_hash(hashed)
+        elapsed = time.perf_counter() - start
+        estimate = sketch.count()
+        error = (estimate - visitors) / visitors
+        print(f'{precision:>9} {estimate:>12,} {error:>+8.2%} {1.04 / sketch.m ** 0.5:>9.2%} '
+              f'{len(sketch.to_bytes()):>7,}B {visitors / elapsed:>12,.0f}')
+
+    # Daily sketches combine into a range estimate without double counting repeat visitors
+    days = [HyperLogLog(12) for _ in range(7)]
+    for i, hashed in enumerate(hashes):
+        days[i % 7].add_hash(hashed)
+        days[(i + 1) % 7].add_hash(hashed)
+    week = HyperLogLog(12)
+    for day in days:
+        week.merge(HyperLogLog.from_bytes(day.to_bytes()))
+    print(f'7 merged daily sketches, every visitor seen on two days: estimate {week.count():,} '
+          f'({(week.count() - visitors) / visitors:+.2%})')
+
+    small = HyperLogLog(12)
+    for hashed in hashes[:50]:
+        small.add_hash(hashed)
+    print(f'sparse blob for a link with 50 visitors: {len(small.to_bytes())} bytes, estimate {small.count()}')
+
+
+if __name__ == '__main__':
+    main()
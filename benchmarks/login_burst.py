@@ -0,0 +1,97 @@
+"""Redirect latency while a burst of logins is hashing passwords.
+
+Drives the app in-process over ASGI, so anything that blocks the event loop
+shows up directly in redirect latency. Redirects are issued on a fixed schedule
+and timed from when they were due, so a stalled loop counts against them. The "inline" row swaps in a hasher that
+calls bcrypt on the event loop, as the handlers used to.
+Run from the project root:  python benchmarks/login_burst.py [logins] [redirects]
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{TMP}/bench.db'
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+os.environ.setdefault('ALGORITHM', 'HS256')
+
+import httpx
+
+import routers.auth
+from main import app
+from password_hashing import PasswordHasher, password_hasher
+
+REDIRECT_INTERVAL = 0.005
+
+
+class InlineHasher(PasswordHasher):
+    async def hash(self, password):
+        return self.context.hash(password)
+
+    async def verify(self, password, hashed):
+        return self.context.verify(password, hashed)
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+
+async def redirects(client, short_code, count, timings):
+    start = time.perf_counter()
+    for i in range(count):
+        due = start + i * REDIRECT_INTERVAL
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        response = await client.get(f'/urls/{short_code}')
+        timings.append(time.perf_counter() - due)
+        assert response.status_code == 307
+
+
+async def login(client):
+    response = await client.post('/auth/token', data={'username': 'bench', 'password': 'benchmark-password'})
+    assert response.status_code in (200, 503), response.text
+
+
+async def run(client, short_code, logins, count):
+    timings = []
+    tasks = [asyncio.create_task(login(client)) for _ in range(logins)]
+    await redirects(client, short_code, count, timings)
+    await asyncio.gather(*tasks)
+    return timings
+
+
+async def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            await client.post('/auth/', json={'email': 'b@bench', 'username': 'bench', 'firstname': 'b', 'lastname': 'b',
+                                              'password': 'benchmark-password', 'role': 'user'})
+            token = (await client.post('/auth/token', data={'username': 'bench', 'password': 'benchmark-password'})).json()
+            created = await client.post('/urls/', json={'long_url': 'https://example.com/'},
+                                        headers={'Authorization': f"Bearer {token['access_token']}"})
+            short_code = created.json()['short_code']
+            await run(client, short_code, 0, count)  # warm-up
+
+            print(f'{logins} concurrent logins, {count} redirects every {REDIRECT_INTERVAL * 1000:.0f} ms, {password_hasher.workers} hash workers')
+            print(f'{"scenario":<24} {"p50 (ms)":>9} {"p99 (ms)":>9} {"max (ms)":>9}')
+            scenarios = [('no logins', None, 0), ('logins, inline bcrypt', InlineHasher(password_hasher.context, 1, 1), logins),
+                         ('logins, hash pool', password_hasher, logins)]
+            for name, hasher, burst in scenarios:
+                if hasher is not None:
+                    routers.auth.password_hasher = hasher
+                timings = await run(client, short_code, burst, count)
+                print(f'{name:<24} {percentile(timings, 0.5):>9.2f} {percentile(timings, 0.99):>9.2f} {max(timings) * 1000:>9.2f}')
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
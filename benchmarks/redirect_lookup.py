@@ -0,0 +1,79 @@
+"""Per-request latency of the redirect lookup, before and after the lean Core path.
+
+Run from the project root:  python benchmarks/redirect_lookup.py [rows] [requests]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Urls
+
+
+def orm_two_query_redirect(Session, short_code):
+    # Baseline: full ORM lookup, then increment_access_count re-selects and commits
+    db = Session()
+    try:
+        req_url = db.query(Urls).filter(Urls.short_code == short_code).first()
+        url = db.query(Urls).filter(Urls.short_code == short_code).first()
+        url.access_count += 1
+        db.commit()
+        return req_url.url
+    finally:
+        db.close()
+
+
+def core_single_lookup_redirect(engine, pending, short_code):
+    with engine.connect() as conn:
+        long_url = conn.execute(select(Urls.url).where(Urls.short_code == short_code)).scalar()
+    pending[short_code] = pending.get(short_code, 0) + 1
+    return long_url
+
+
+def report(name, samples):
+    samples.sort()
+    n = len(samples)
+    print(f'{name:<32} mean {sum(samples) / n * 1e6:8.1f} us   p50 {samples[n // 2] * 1e6:8.1f} us   '
+          f'p99 {samples[int(n * 0.99)] * 1e6:8.1f} us')
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{tmp}/bench.db', connect_args={'check_same_thread': False})
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(insert(Urls), [
+                {'url': f'https://example.com/{i}', 'short_code': f'c{i:07d}', 'access_count': 0, 'owner_id': 1}
+                for i in range(rows)
+            ])
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        codes = [f'c{random.randrange(rows):07d}' for _ in range(requests)]
+
+        before = []
+        for code in codes:
+            start = time.perf_counter()
+            orm_two_query_redirect(Session, code)
+            before.append(time.perf_counter() - start)
+
+        pending = {}
+        after = []
+        for code in codes:
+            start = time.perf_counter()
+            core_single_lookup_redirect(engine, pending, code)
+            after.append(time.perf_counter() - start)
+
+        print(f'{rows} rows, {requests} redirects')
+        report('before (ORM, 2 SELECT + commit)', before)
+        report('after (Core, 1 SELECT)', after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Latency of owner-scoped FTS5 link search as the urls table grows.
+
+Rows are indexed by the same triggers the app installs. Hosts and path words
+come from small vocabularies, so common terms match a large share of rows.
+Run from the project root:  python benchmarks/search_latency.py [max_rows]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select
+
+from models import Base, Urls
+from pagination import keyset_page
+from search import create_search_index, match_expression, urls_fts
+
+OWNERS = 1000
+SAMPLES = 20
+SIZES = (100_000, 1_000_000, 3_000_000)
+HOSTS = ('docs.python.org', 'github.com', 'news.ycombinator.com', 'example.com', 'youtube.com',
+         'medium.com', 'shop.example.net', 'en.wikipedia.org')
+WORDS = ('python', 'docs', 'library', 'asyncio', 'news', 'blog', 'shop', 'item', 'video', 'watch',
+         'article', 'guide', 'tutorial', 'api', 'reference')
+QUERIES = ('python', 'asyncio guide', 'wiki', 'tut', 'c0001')
+
+
+def fill(engine, start, stop, rng):
+    step = 50_000
+    for offset in range(start, stop, step):
+        rows = [{'url': f'https://{rng.choice(HOSTS)}/{rng.choice(WORDS)}/{rng.choice(WORDS)}-{i}',
+                 'short_code': f'c{i:07x}', 'access_count': 0, 'owner_id': i % OWNERS}
+                for i in range(offset, min(offset + step, stop))]
+        with engine.begin() as conn:
+            conn.execute(insert(Urls), rows)
+
+
+def measure(engine, query):
+    timings = []
+    for i in range(SAMPLES):
+        statement = keyset_page(select(urls_fts.c.rowid, urls_fts.c.rank).where(match_expression(query, i % OWNERS)),
+                                urls_fts.c.rank, urls_fts.c.rowid, 'rank', 'asc', 50, None)
+        start = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execute(statement).all()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{tmp}/bench.db')
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            create_search_index(conn)
+        print(f'{"rows":>10} ' + ' '.join(f'{query + " (ms)":>18}' for query in QUERIES))
+        filled = 0
+        for size in SIZES:
+            if size > max_rows:
+                break
+            fill(engine, filled, size, rng)
+            filled = size
+            print(f'{size:>10,} ' + ' '.join(f'{measure(engine, query):>18.2f}' for query in QUERIES))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Fetch + serialise time for a 100k-row URL listing.
+
+Compares the old path (ORM entities through jsonable_encoder and the stdlib
+JSONResponse) with column-only rows validated by the lean response model and
+rendered by ORJSONResponse. Run from the project root:
+    python benchmarks/serialize_lists.py [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Urls
+from routers.urls import URL_COLUMNS, UrlSchema
+
+ROUNDS = 3
+
+
+def fill(engine, rows):
+    step = 50_000
+    for offset in range(0, rows, step):
+        batch = [{'url': f'https://example.com/page/{i}', 'short_code': f'r{i}', 'access_count': i % 100,
+                  'owner_id': 1, 'unique_visitors': i % 10}
+                 for i in range(offset, min(offset + step, rows))]
+        with engine.begin() as conn:
+            conn.execute(insert(Urls), batch)
+
+
+def orm_path(Session):
+    with Session() as db:
+        start = time.perf_counter()
+        records = db.execute(select(Urls)).scalars().all()
+        fetched = time.perf_counter()
+        body = JSONResponse(jsonable_encoder(records)).body
+        return fetched - start, time.perf_counter() - fetched, len(body)
+
+
+def lean_path(Session, adapter):
+    with Session() as db:
+        start = time.perf_counter()
+        rows = [dict(row._mapping) for row in db.execute(select(*URL_COLUMNS))]
+        fetched = time.perf_counter()
+        body = ORJSONResponse(adapter.dump_python(adapter.validate_python(rows), mode='json')).body
+        return fetched - start, time.perf_counter() - fetched, len(body)
+
+
+def best(fn):
+    runs = [fn() for _ in range(ROUNDS)]
+    return min(runs, key=lambda run: run[0] + run[1])
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    adapter = TypeAdapter(list[UrlSchema])
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{tmp}/bench.db')
+        Base.metadata.create_all(bind=engine)
+        fill(engine, rows)
+        Session = sessionmaker(bind=engine)
+        print(f'{rows:,} rows')
+        print(f'{"path":<32} {"fetch (ms)":>11} {"serialise (ms)":>15} {"body (KiB)":>11}')
+        for name, fn in (('ORM + jsonable_encoder + json', lambda: orm_path(Session)),
+                         ('columns + response model + orjson', lambda: lean_path(Session, adapter))):
+            fetch, encode, size = best(fn)
+            print(f'{name:<32} {fetch * 1000:>11.1f} {encode * 1000:>15.1f} {size / 1024:>11.0f}')
+
+
+if __name__ == '__main__':
+    main()
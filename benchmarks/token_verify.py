@@ -0,0 +1,46 @@
+"""Per-request cost of authenticating a reused bearer token.
+
+Compares python-jose's full decode + HMAC check with a verified-token cache hit.
+Run from the project root:  python benchmarks/token_verify.py [requests]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jose import jwt
+
+from token_cache import TokenCache
+
+SECRET_KEY = 'benchmark-secret'
+ALGORITHM = 'HS256'
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    token = jwt.encode({'sub': 'bench', 'id': 1, 'user_role': 'user',
+                        'exp': datetime.now(timezone.utc) + timedelta(minutes=20)}, SECRET_KEY, algorithm=ALGORITHM)
+    cache = TokenCache(10_000, 5)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    decode = (time.perf_counter() - start) / count
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    cache.set(token, SECRET_KEY, ALGORITHM, {'username': 'bench', 'id': 1, 'role': 'user'}, payload['exp'])
+    start = time.perf_counter()
+    for _ in range(count):
+        cache.get(token, SECRET_KEY, ALGORITHM)
+    cached = (time.perf_counter() - start) / count
+
+    print(f'{"path":<16} {"per call (us)":>14}')
+    print(f'{"jwt.decode":<16} {decode * 1e6:>14.2f}')
+    print(f'{"cache hit":<16} {cached * 1e6:>14.2f}')
+    print(f'hit rate {cache.stats()["hit_rate"]:.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Click-write latency while an admin deletes a user with many links.
+
+One user owns `rows` links with two click events each. A writer thread bumps an
+unrelated link's access_count every 5 ms (like the click flusher) while the user
+is deleted, either in one transaction (the old delete_user) or chunked by
+UserDeletionJobs. Reports the writer's latency and how long the delete took.
+Run from the project root:  python benchmarks/user_delete_lock.py [rows]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+TMP = tempfile.mkdtemp()
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['DATABASE_URL'] = f'sqlite:///{TMP}/bench.db'
+os.environ['DB_PROFILE'] = 'production'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, insert, select, update
+
+from database import engine
+from migrations import upgrade_schema
+from models import ClickEvents, Urls, Users
+from user_deletion import UserDeletionJobs
+
+VICTIM = 1
+BYSTANDER = 2
+WRITE_INTERVAL = 0.005
+
+
+def fill(rows):
+    with engine.begin() as conn:
+        conn.execute(delete(ClickEvents))
+        conn.execute(delete(Urls))
+        conn.execute(delete(Users))
+        conn.execute(insert(Users), [{'id': VICTIM, 'username': 'victim'}, {'id': BYSTANDER, 'username': 'other'}])
+        conn.execute(insert(Urls), [{'id': 1, 'url': 'https://other.example/', 'short_code': 'other',
+                                     'access_count': 0, 'owner_id': BYSTANDER}])
+    now = datetime.now()
+    step = 50_000
+    for offset in range(0, rows, step):
+        ids = range(offset + 2, min(offset + step, rows) + 2)
+        with engine.begin() as conn:
+            conn.execute(insert(Urls), [{'id': i, 'url': f'https://victim.example/{i}', 'short_code': f'v{i:07x}',
+                                         'access_count': 0, 'owner_id': VICTIM} for i in ids])
+            conn.execute(insert(ClickEvents), [{'url_id': i, 'short_code': f'v{i:07x}', 'clicked_at': now} for i in ids for _ in range(2)])
+
+
+def delete_in_one_transaction():
+    owned = select(Urls.id).where(Urls.owner_id == VICTIM)
+    with engine.begin() as conn:
+        conn.execute(delete(ClickEvents).where(ClickEvents.url_id.in_(owned)))
+        conn.execute(delete(Urls).where(Urls.owner_id == VICTIM))
+        conn.execute(delete(Users).where(Users.id == VICTIM))
+
+
+def delete_in_chunks():
+    jobs = UserDeletionJobs(500, 0.01, 10, 300)
+    jobs.begin(VICTIM)
+    while jobs.delete_chunk(VICTIM):
+        time.sleep(jobs.pause)
+    jobs.delete_user(VICTIM)
+
+
+def run(rows, delete_user):
+    fill(rows)
+    latencies = []
+    done = threading.Event()
+
+    def writer():
+        while not done.is_set():
+            start = time.perf_counter()
+            with engine.begin() as conn:
+                conn.execute(update(Urls).where(Urls.id == 1).values(access_count=Urls.access_count + 1))
+            latencies.append(time.perf_counter() - start)
+            time.sleep(WRITE_INTERVAL)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    delete_user()
+    elapsed = time.perf_counter() - start
+    done.set()
+    thread.join()
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    return elapsed, pick(0.5), pick(0.99), latencies[-1] * 1000
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    upgrade_schema(engine)
+    print(f'{rows:,} links owned by the deleted user')
+    print(f'{"strategy":>16} {"delete (s)":>11} {"write p50 (ms)":>15} {"write p99 (ms)":>15} {"write max (ms)":>15}')
+    for name, delete_user in (('one transaction', delete_in_one_transaction), ('chunked', delete_in_chunks)):
+        elapsed, p50, p99, worst = run(rows, delete_user)
+        print(f'{name:>16} {elapsed:11.2f} {p50:15.2f} {p99:15.2f} {worst:15.1f}')
+
+
+if __name__ == '__main__':
+    main()
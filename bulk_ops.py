@@ -0,0 +1,126 @@
+import re
+
+from sqlalchemy import delete, or_, select, update
+
+import config
+from api_keys import api_key_cache
+from click_counter import click_counter
+from database import IN_CHUNK_SIZE, engine
+from models import ApiKeys, ClickEvents, ClickRollups, Urls, UrlVisitorDays, Users
+from short_code_filter import short_code_filter
+from url_cache import url_cache
+
+URL_ANALYTICS_TABLES = (ClickEvents, ClickRollups, UrlVisitorDays)
+HOST_PATTERN = re.compile(r'^[a-z0-9.\-\[\]:]+$')
+
+
+def host_criterion(host: str):
+    """Links whose URL host is exactly `host` under http or https, on any port."""
+    host = host.strip().lower()
+    if not HOST_PATTERN.match(host):
+        raise ValueError(f'invalid host {host!r}')
+    # LIKE is case-insensitive for ASCII, so this also matches mixed-case stored URLs
+    return or_(*[Urls.url.like(f'{scheme}://{host}{rest}')
+                 for scheme in ('http', 'https') for rest in ('', '/%', ':%', '?%', '#%')])
+
+
+def url_criteria(owner_id=None, host=None, created_before=None, zero_clicks=False):
+    criteria = []
+    if owner_id is not None:
+        criteria.append(Urls.owner_id == owner_id)
+    if host is not None:
+        criteria.append(host_criterion(host))
+    if created_before is not None:
+        criteria.append(Urls.created_at < created_before)
+    if zero_clicks:
+        criteria.append(or_(Urls.access_count == 0, Urls.access_count.is_(None)))
+    return criteria
+
+
+def url_delete_statements(url_ids):
+    # Click analytics go with their link so no orphaned rows are left behind
+    return [*(delete(table).where(table.url_id.in_(url_ids)) for table in URL_ANALYTICS_TABLES),
+            delete(Urls).where(Urls.id.in_(url_ids))]
+
+
+def delete_url_rows(conn, rows):
+    for statement in url_delete_statements([row.id for row in rows]):
+        conn.execute(statement)
+
+
+def forget_url_rows(rows):
+    # Call after the delete commits so a redirect cannot re-cache a deleted link
+    url_cache.invalidate(*[row.short_code for row in rows])
+    for row in rows:
+        short_code_filter.remove(row.short_code, row.id)
+
+
+def in_chunks(values, size):
+    if values is None:
+        yield None
+        return
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def bulk_delete_urls(criteria, short_codes=None, zero_clicks=False, batch_size=config.BULK_BATCH_SIZE) -> dict:
+    """Delete links matching every criterion (and short_codes, if given), one transaction per batch.
+
+    Each batch continues after the last id the previous one saw, so rows kept back and
+    rows already passed are never scanned again.
+    """
+    batch_size = max(1, min(batch_size, IN_CHUNK_SIZE))
+    if zero_clicks:
+        # Write buffered clicks first so access_count is current
+        click_counter.flush()
+    deleted = batches = 0
+    for chunk in in_chunks(short_codes, batch_size):
+        scope = list(criteria)
+        if chunk is not None:
+            scope.append(Urls.short_code.in_(chunk))
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    select(Urls.id, Urls.short_code).where(*scope, Urls.id > last_id).order_by(Urls.id).limit(batch_size)
+                ).all()
+                # Links clicked since the flush above are no longer unused; keep them
+                clicked = {row.id for row in rows if click_counter.pending_for(row.short_code)} if zero_clicks else set()
+                doomed = [row for row in rows if row.id not in clicked]
+                if doomed:
+                    delete_url_rows(conn, doomed)
+            if rows:
+                batches += 1
+                last_id = rows[-1].id
+            forget_url_rows(doomed)
+            deleted += len(doomed)
+            if len(rows) < batch_size:
+                break
+    return {'affected': deleted, 'batches': batches}
+
+
+def bulk_deactivate_users(criteria, user_ids=None, batch_size=config.BULK_BATCH_SIZE) -> dict:
+    """Mark matching non-admin users inactive, one transaction per batch; their API keys stop working."""
+    batch_size = max(1, min(batch_size, IN_CHUNK_SIZE))
+    deactivated = batches = 0
+    for chunk in in_chunks(user_ids, batch_size):
+        scope = [*criteria, Users.is_active.isnot(False), or_(Users.role.is_(None), Users.role != 'admin')]
+        if chunk is not None:
+            scope.append(Users.id.in_(chunk))
+        last_id = 0
+        while True:
+            with engine.begin() as conn:
+                ids = conn.execute(
+                    select(Users.id).where(*scope, Users.id > last_id).order_by(Users.id).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                conn.execute(update(Users).where(Users.id.in_(ids)).values(is_active=False))
+                prefixes = conn.execute(select(ApiKeys.prefix).where(ApiKeys.user_id.in_(ids))).scalars().all()
+            api_key_cache.invalidate(*prefixes)
+            deactivated += len(ids)
+            batches += 1
+            last_id = ids[-1]
+            if len(ids) < batch_size:
+                break
+    return {'affected': deactivated, 'batches': batches}
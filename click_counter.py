@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import threading
+from collections import Counter
+
+from sqlalchemy import update, case
+
+import config
+from database import IN_CHUNK_SIZE, engine
+from models import Urls
+
+logger = logging.getLogger(__name__)
+
+
+class ClickCounter:
+    """Buffers redirect clicks in memory and writes them to urls.access_count in batches."""
+
+    def __init__(self, flush_interval: float, flush_threshold: int):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pending = Counter()
+        self._inflight = Counter()
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = None
+        self.flushes = 0
+        self.flushed_clicks = 0
+
+    def record(self, short_code: str):
+        with self._lock:
+            self._pending[short_code] += 1
+            self._pending_total += 1
+            full = self._pending_total >= self.flush_threshold
+        if full and self._wake is not None:
+            self._wake.set()
+
+    def pending_for(self, short_code: str) -> int:
+        with self._lock:
+            return self._pending[short_code] + self._inflight[short_code]
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = self._pending
+                self._inflight = batch
+                self._pending = Counter()
+                self._pending_total = 0
+            try:
+                items = list(batch.items())
+                with engine.begin() as conn:
+                    for i in range(0, len(items), IN_CHUNK_SIZE):
+                        deltas = dict(items[i:i + IN_CHUNK_SIZE])
+                        conn.execute(
+                            update(Urls)
+                            .where(Urls.short_code.in_(deltas.keys()))
+                            .values(access_count=Urls.access_count + case(deltas, value=Urls.short_code, else_=0))
+                        )
+            except Exception:
+                # Put the clicks back so the next flush retries them
+                with self._lock:
+                    self._pending.update(batch)
+                    self._pending_total += sum(batch.values())
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = Counter()
+            clicks = sum(batch.values())
+            self.flushes += 1
+            self.flushed_clicks += clicks
+            return clicks
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                try:
+                    await asyncio.to_thread(self.flush)
+                except Exception:
+                    logger.exception('click flush failed, will retry')
+        finally:
+            self._wake = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending_clicks': self._pending_total,
+                'pending_codes': len(self._pending),
+                'flushes': self.flushes,
+                'flushed_clicks': self.flushed_clicks,
+            }
+
+
+click_counter = ClickCounter(config.CLICK_FLUSH_INTERVAL, config.CLICK_FLUSH_THRESHOLD)
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import ipaddress
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select, update, bindparam, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import config
+from database import IN_CHUNK_SIZE, engine
+from hyperloglog import HyperLogLog, visitor_hash
+from models import ClickEvents, ClickRollups, Urls, UrlVisitorDays
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+ROLLUP_GRANULARITIES = ('hour', 'day')
+
+
+def ip_prefix(host):
+    # Store the network, not the visitor's address: /24 for IPv4, /48 for IPv6
+    try:
+        address = ipaddress.ip_address(host)
+    except (TypeError, ValueError):
+        return None
+    prefix = 24 if address.version == 4 else 48
+    return str(ipaddress.ip_network(f'{address}/{prefix}', strict=False))
+
+
+def bucket_start(clicked_at: datetime, granularity: str) -> datetime:
+    # Buckets are stored as naive UTC
+    start = clicked_at.astimezone(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        start = start.replace(hour=0)
+    return start
+
+
+def user_agent_hash(user_agent):
+    if not user_agent:
+        return None
+    return hashlib.sha256(user_agent.encode()).hexdigest()[:16]
+
+
+class ClickLog:
+    """Queues redirect click events and bulk-inserts them into click_events from a background task.
+
+    Each batch also bumps the hourly and daily click_rollups buckets and merges visitor
+    hashes into the per-link HyperLogLog sketches in the same transaction.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, queue_size: int, overflow: str,
+                 hll_precision: int = 12):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'CLICK_LOG_OVERFLOW must be one of {OVERFLOW_POLICIES}')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.hll_precision = hll_precision
+        self._queue = None
+        self._task = None
+        self._stopping = False
+        self.published = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    async def publish(self, short_code: str, referrer, user_agent, client_host):
+        queue = self._queue
+        if queue is None or self._stopping:
+            self.dropped += 1
+            return
+        event = {
+            'short_code': short_code,
+            'clicked_at': datetime.now(timezone.utc),
+            'referrer': referrer[:512] if referrer else None,
+            'user_agent_hash': user_agent_hash(user_agent),
+            'ip_prefix': ip_prefix(client_host),
+            'visitor_hash': visitor_hash(client_host, user_agent),
+        }
+        if queue.full():
+            if self.overflow == 'drop_newest':
+                self.dropped += 1
+                return
+            if self.overflow == 'drop_oldest':
+                queue.get_nowait()
+                self.dropped += 1
+        await queue.put(event)
+        self.published += 1
+
+    def write(self, events):
+        codes = list({event['short_code'] for event in events})
+        url_ids = {}
+        with engine.begin() as conn:
+            for i in range(0, len(codes), IN_CHUNK_SIZE):
+                rows = conn.execute(
+                    select(Urls.id, Urls.short_code).where(Urls.short_code.in_(codes[i:i + IN_CHUNK_SIZE]))
+                )
+                url_ids.update({row.short_code: row.id for row in rows})
+            visitors = []
+            for event in events:
+                event['url_id'] = url_ids.get(event['short_code'])
+                visitors.append((event['url_id'], event['clicked_at'], event.pop('visitor_hash')))
+            conn.execute(insert(ClickEvents), events)
+            self.write_rollups(conn, events)
+            self.write_visitor_sketches(conn, visitors)
+
+    def write_rollups(self, conn, events):
+        buckets = Counter()
+        for event in events:
+            if event['url_id'] is None:
+                continue
+            for granularity in ROLLUP_GRANULARITIES:
+                buckets[(event['url_id'], granularity, bucket_start(event['clicked_at'], granularity))] += 1
+        if not buckets:
+            return
+        statement = sqlite_insert(ClickRollups)
+        statement = statement.on_conflict_do_update(
+            index_elements=[ClickRollups.url_id, ClickRollups.granularity, ClickRollups.bucket_start],
+            set_={'clicks': ClickRollups.clicks + statement.excluded.clicks},
+        )
+        conn.execute(statement, [
+            {'url_id': url_id, 'granularity': granularity, 'bucket_start': start, 'clicks': clicks}
+            for (url_id, granularity, start), clicks in buckets.items()
+        ])
+
+    def write_visitor_sketches(self, conn, visitors):
+        # Fold the batch into each link's lifetime sketch and its per-day sketches
+        lifetime = {}
+        daily = {}
+        for url_id, clicked_at, hashed in visitors:
+            if url_id is None:
+                continue
+            day = clicked_at.astimezone(timezone.utc).date()
+            for sketches, key in ((lifetime, url_id), (daily, (url_id, day))):
+                if key not in sketches:
+                    sketches[key] = HyperLogLog(self.hll_precision)
+                sketches[key].add_hash(hashed)
+        if not lifetime:
+            return
+
+        stored = conn.execute(select(Urls.id, Urls.visitor_sketch).where(Urls.id.in_(list(lifetime))))
+        for row in stored:
+            if row.visitor_sketch:
+                lifetime[row.id].merge(HyperLogLog.from_bytes(row.visitor_sketch))
+        conn.execute(
+            update(Urls).where(Urls.id == bindparam('b_id'))
+            .values(visitor_sketch=bindparam('b_sketch'), unique_visitors=bindparam('b_count'),
+                    updated_at=Urls.updated_at),
+            [{'b_id': url_id, 'b_sketch': sketch.to_bytes(), 'b_count': sketch.count()}
+             for url_id, sketch in lifetime.items()],
+        )
+
+        stored = conn.execute(
+            select(UrlVisitorDays.url_id, UrlVisitorDays.day, UrlVisitorDays.sketch)
+            .where(tuple_(UrlVisitorDays.url_id, UrlVisitorDays.day).in_(list(daily.keys())))
+        )
+        for row in stored:
+            daily[(row.url_id, row.day)].merge(HyperLogLog.from_bytes(row.sketch))
+        statement = sqlite_insert(UrlVisitorDays)
+        conn.execute(
+            statement.on_conflict_do_update(
+                index_elements=[UrlVisitorDays.url_id, UrlVisitorDays.day],
+                set_={'sketch': statement.excluded.sketch},
+            ),
+            [{'url_id': url_id, 'day': day, 'sketch': sketch.to_bytes()} for (url_id, day), sketch in daily.items()],
+        )
+
+    async def _next_batch(self):
+        queue = self._queue
+        batch = []
+        if self._stopping and queue.empty():
+            # Drained; the sentinel may have been skipped because the queue was full
+            return batch
+        try:
+            first = await asyncio.wait_for(queue.get(), timeout=self.flush_interval)
+        except asyncio.TimeoutError:
+            return batch
+        if first is not None:
+            batch.append(first)
+        while len(batch) < self.batch_size and not queue.empty():
+            event = queue.get_nowait()
+            if event is not None:
+                batch.append(event)
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if batch:
+                try:
+                    await asyncio.to_thread(self.write, batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                except Exception:
+                    self.failed += len(batch)
+                    logger.exception('click event batch insert failed')
+            elif self._stopping and self._queue.empty():
+                return
+
+    def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let the drain task empty the queue instead of cancelling it, so no event is lost
+        if self._task is None:
+            return
+        self._stopping = True
+        if not self._queue.full():
+            self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'queue_size': self.queue_size,
+            'overflow': self.overflow,
+            'published': self.published,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches,
+        }
+
+
+click_log = ClickLog(config.CLICK_LOG_BATCH_SIZE, config.CLICK_LOG_FLUSH_INTERVAL,
+                     config.CLICK_LOG_QUEUE_SIZE, config.CLICK_LOG_OVERFLOW, config.HLL_PRECISION)
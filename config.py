@@ -0,0 +1,109 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+env_path = Path(__file__).resolve().parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+
+# Verified JWT claims cache: entries are dropped TOKEN_CACHE_EXPIRY_MARGIN seconds before exp
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+TOKEN_CACHE_EXPIRY_MARGIN = float(os.getenv('TOKEN_CACHE_EXPIRY_MARGIN', '5'))
+
+# API keys are stored as HMAC-SHA256(API_KEY_SECRET, key); changing the secret invalidates every key.
+# Verified keys are cached per prefix for API_KEY_CACHE_TTL seconds, which bounds how long a
+# revocation takes to reach other workers.
+API_KEY_SECRET = os.getenv('API_KEY_SECRET', SECRET_KEY or '')
+API_KEY_CACHE_SIZE = int(os.getenv('API_KEY_CACHE_SIZE', '10000'))
+API_KEY_CACHE_TTL = float(os.getenv('API_KEY_CACHE_TTL', '60'))
+API_KEYS_PER_USER = int(os.getenv('API_KEYS_PER_USER', '10'))
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./url.db')
+# 'default' keeps SQLite's stock settings, 'production' enables WAL and the pragmas below
+DB_PROFILE = os.getenv('DB_PROFILE', 'default')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+# How long a starting worker waits for another worker's schema upgrade to finish
+MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv('MIGRATION_LOCK_TIMEOUT_MS', '600000'))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+# Negative values are KiB, as in PRAGMA cache_size
+DB_CACHE_SIZE = int(os.getenv('DB_CACHE_SIZE', '-65536'))
+
+# Short code -> destination URL cache used by the redirect path. Updates and deletes made by
+# other workers reach this worker's cache within URL_CACHE_SYNC_INTERVAL seconds; the
+# url_changes rows that carry them are kept for URL_CHANGE_RETENTION seconds.
+URL_CACHE_SIZE = int(os.getenv('URL_CACHE_SIZE', '10000'))
+URL_CACHE_TTL = float(os.getenv('URL_CACHE_TTL', '300'))
+URL_CACHE_SYNC_INTERVAL = float(os.getenv('URL_CACHE_SYNC_INTERVAL', '1.0'))
+URL_CHANGE_RETENTION = int(os.getenv('URL_CHANGE_RETENTION', '3600'))
+
+# Write-behind click counting: pending clicks are flushed to urls.access_count
+# every CLICK_FLUSH_INTERVAL seconds or once CLICK_FLUSH_THRESHOLD clicks are buffered
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', '1.0'))
+CLICK_FLUSH_THRESHOLD = int(os.getenv('CLICK_FLUSH_THRESHOLD', '1000'))
+
+# 'sync' runs the sqlite3 driver in the threadpool, 'async' uses aiosqlite with AsyncSession
+DB_MODE = os.getenv('DB_MODE', 'sync')
+
+# Counting Bloom filter over existing short codes, used to 404 unknown codes without a query.
+# With several workers each one picks up codes created elsewhere every BLOOM_SYNC_INTERVAL seconds.
+BLOOM_ENABLED = os.getenv('BLOOM_ENABLED', 'true').lower() == 'true'
+BLOOM_CAPACITY = int(os.getenv('BLOOM_CAPACITY', '1000000'))
+BLOOM_FP_RATE = float(os.getenv('BLOOM_FP_RATE', '0.01'))
+BLOOM_SYNC_INTERVAL = float(os.getenv('BLOOM_SYNC_INTERVAL', '1.0'))
+
+# Per-click event log drained from an in-memory queue with bulk inserts.
+# CLICK_LOG_OVERFLOW decides what happens when the queue is full:
+# 'drop_oldest', 'drop_newest' or 'block' (the redirect waits for space).
+CLICK_LOG_BATCH_SIZE = int(os.getenv('CLICK_LOG_BATCH_SIZE', '500'))
+CLICK_LOG_FLUSH_INTERVAL = float(os.getenv('CLICK_LOG_FLUSH_INTERVAL', '1.0'))
+CLICK_LOG_QUEUE_SIZE = int(os.getenv('CLICK_LOG_QUEUE_SIZE', '10000'))
+CLICK_LOG_OVERFLOW = os.getenv('CLICK_LOG_OVERFLOW', 'drop_oldest')
+
+# HyperLogLog precision for unique visitor estimates: 2**p registers, ~1.04/sqrt(2**p) error
+HLL_PRECISION = int(os.getenv('HLL_PRECISION', '12'))
+
+# Sliding-window trending links: the window is split into TRENDING_BUCKET_SECONDS buckets,
+# each tracking at most TRENDING_CAPACITY codes with Space-Saving
+TRENDING_BUCKET_SECONDS = int(os.getenv('TRENDING_BUCKET_SECONDS', '10'))
+TRENDING_MAX_WINDOW_SECONDS = int(os.getenv('TRENDING_MAX_WINDOW_SECONDS', '3600'))
+TRENDING_CAPACITY = int(os.getenv('TRENDING_CAPACITY', '200'))
+
+# Largest number of long URLs accepted by POST /urls/batch
+BATCH_SHORTEN_MAX = int(os.getenv('BATCH_SHORTEN_MAX', '10000'))
+
+# Short code generation: 'sequence' hands out base62 codes from per-worker leased
+# id blocks without probing the table, 'hash' is the original salted SHA-256 scheme
+SHORT_CODE_MODE = os.getenv('SHORT_CODE_MODE', 'sequence')
+SHORT_CODE_BLOCK_SIZE = int(os.getenv('SHORT_CODE_BLOCK_SIZE', '1000'))
+# Keys the permutation from sequence ids to codes so codes cannot be enumerated.
+# Changing it may map new ids onto issued codes; those inserts fail and are retried.
+SHORT_CODE_SECRET = os.getenv('SHORT_CODE_SECRET', SECRET_KEY or '')
+
+# bcrypt hashing/verification runs in its own thread pool so it never blocks the event loop.
+# Calls beyond PASSWORD_HASH_MAX_PENDING (running + queued) are rejected with 503.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '64'))
+
+# Per-worker token-bucket rate limits, written as '<requests>/<seconds>'.
+# Login is keyed by client IP, shortening by user id. Idle buckets are forgotten once full again.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_LOGIN = os.getenv('RATE_LIMIT_LOGIN', '10/60')
+RATE_LIMIT_SHORTEN = os.getenv('RATE_LIMIT_SHORTEN', '120/60')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+
+# Admin user deletion runs as a background job: links and their analytics are deleted
+# USER_DELETE_CHUNK_SIZE at a time (at most 500), one short transaction per chunk.
+# A job not updated for USER_DELETE_STALE_AFTER seconds is taken over by the next delete.
+USER_DELETE_CHUNK_SIZE = int(os.getenv('USER_DELETE_CHUNK_SIZE', '500'))
+USER_DELETE_CHUNK_PAUSE = float(os.getenv('USER_DELETE_CHUNK_PAUSE', '0.01'))
+USER_DELETE_MAX_JOBS = int(os.getenv('USER_DELETE_MAX_JOBS', '100'))
+USER_DELETE_STALE_AFTER = float(os.getenv('USER_DELETE_STALE_AFTER', '300'))
+
+# Admin bulk operations: rows per transaction (at most 500) and the longest explicit list accepted
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '500'))
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '10000'))
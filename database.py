@@ -1,12 +1,107 @@
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from starlette.concurrency import run_in_threadpool
+import config
 
 
-SQLALCHEMY_DATABASE_URL='sqlite:///./url.db'
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace('sqlite://', 'sqlite+aiosqlite://', 1)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL , connect_args={'check_same_thread' : False})
+engine_options = {}
+if config.DB_PROFILE == 'production':
+    engine_options = {
+        'pool_size': config.DB_POOL_SIZE,
+        'max_overflow': config.DB_MAX_OVERFLOW,
+        'pool_timeout': config.DB_POOL_TIMEOUT,
+    }
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets redirect readers run alongside the click writer; NORMAL sync is safe under WAL
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA mmap_size={config.DB_MMAP_SIZE}')
+    cursor.execute(f'PRAGMA cache_size={config.DB_CACHE_SIZE}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL , connect_args={'check_same_thread' : False}, **engine_options)
+if config.DB_PROFILE == 'production':
+    event.listen(engine, 'connect', set_sqlite_pragmas)
 
 SessionLocal =  sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if config.DB_MODE == 'async':
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options)
+    if config.DB_PROFILE == 'production':
+        event.listen(async_engine.sync_engine, 'connect', set_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
+
+
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+# Session helpers that work for both DB_MODEs without blocking the event loop
+
+async def execute(db, statement, params=None):
+    if isinstance(db, AsyncSession):
+        return await db.execute(statement, params)
+    return await run_in_threadpool(db.execute, statement, params)
+
+async def commit(db):
+    if isinstance(db, AsyncSession):
+        return await db.commit()
+    return await run_in_threadpool(db.commit)
+
+async def rollback(db):
+    if isinstance(db, AsyncSession):
+        return await db.rollback()
+    return await run_in_threadpool(db.rollback)
+
+async def fetch_scalar(statement):
+    # Session-less statement on a pooled connection, for lean read paths
+    if async_engine is not None:
+        async with async_engine.connect() as conn:
+            return (await conn.execute(statement)).scalar()
+    def run():
+        with engine.connect() as conn:
+            return conn.execute(statement).scalar()
+    return await run_in_threadpool(run)
+
+async def fetch_one(statement):
+    # Same as fetch_scalar, for a single row
+    if async_engine is not None:
+        async with async_engine.connect() as conn:
+            return (await conn.execute(statement)).first()
+    def run():
+        with engine.connect() as conn:
+            return conn.execute(statement).first()
+    return await run_in_threadpool(run)
+
+# Keep IN (...) lists under SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 500
+
+async def select_in_chunks(db, columns, column, values, *criteria):
+    rows = []
+    for i in range(0, len(values), IN_CHUNK_SIZE):
+        result = await execute(db, select(*columns).where(column.in_(values[i:i + IN_CHUNK_SIZE]), *criteria))
+        rows.extend(result.all())
+    return rows
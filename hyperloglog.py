@@ -0,0 +1,68 @@
+import hashlib
+import math
+
+SPARSE = b'S'
+DENSE = b'D'
+
+
+def visitor_hash(*parts) -> int:
+    # 64-bit hash of whatever identifies a visitor; the raw values are never stored
+    key = '|'.join(part or '' for part in parts)
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+class HyperLogLog:
+    """HyperLogLog cardinality sketch over 64-bit hashes with one byte per register.
+
+    Serialised sketches use a sparse (index, value) encoding until that stops being
+    smaller than the dense register array, so links with few visitors stay tiny.
+    """
+
+    def __init__(self, precision: int = 12, registers: bytearray = None):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add_hash(self, value: int):
+        remaining_bits = 64 - self.precision
+        index = value >> remaining_bits
+        remaining = value & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.precision != self.precision:
+            raise ValueError('cannot merge sketches with different precision')
+        registers = self.registers
+        for index, rank in enumerate(other.registers):
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        nonzero = [(index, rank) for index, rank in enumerate(self.registers) if rank]
+        if len(nonzero) * 3 < self.m:
+            body = b''.join(index.to_bytes(2, 'little') + bytes([rank]) for index, rank in nonzero)
+            return SPARSE + bytes([self.precision]) + body
+        return DENSE + bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        kind, precision, body = data[:1], data[1], data[2:]
+        if kind == DENSE:
+            return cls(precision, bytearray(body))
+        sketch = cls(precision)
+        for offset in range(0, len(body), 3):
+            sketch.registers[int.from_bytes(body[offset:offset + 2], 'little')] = body[offset + 2]
+        return sketch
@@ -0,0 +1,205 @@
+"""Stream links from CSV or NDJSON into the urls table for one owner.
+
+    python import_links.py links.csv --owner-id 3
+    zcat links.ndjson.gz | python import_links.py - --format ndjson --owner-id 3 --errors errors.ndjson
+
+Each record needs a `url` (or `long_url`) and may carry a `short_code` to keep.
+Rows are validated, deduped and inserted chunk by chunk, so memory stays flat
+regardless of file size. Rows that fail are reported with their line number.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, engine, execute, commit, rollback, select_in_chunks
+from migrations import upgrade_schema
+from models import Urls, Users
+from short_codes import code_generator
+from url_utils import hash_url, normalize_url
+
+SHORT_CODE_PATTERN = re.compile(r'^[A-Za-z0-9_-]{3,32}$')
+# Fixed GET routes under /urls/; a link with one of these codes could never be reached
+RESERVED_SHORT_CODES = frozenset({'summary', 'search'})
+MAX_URL_LENGTH = 2048
+
+
+def read_records(stream, fmt):
+    # Yields (line number, record dict) without loading the file
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_num, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                yield line_num, None
+                continue
+            yield line_num, record if isinstance(record, dict) else None
+
+
+def validate(record):
+    if record is None:
+        return None, None, 'unparseable record'
+    long_url = (record.get('url') or record.get('long_url') or '').strip()
+    short_code = (record.get('short_code') or '').strip() or None
+    if not long_url:
+        return None, None, 'missing url'
+    if len(long_url) > MAX_URL_LENGTH:
+        return None, None, 'url too long'
+    parts = urlsplit(long_url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None, None, 'url must be absolute http(s)'
+    if short_code is not None and not SHORT_CODE_PATTERN.match(short_code):
+        return None, None, 'short_code must be 3-32 characters of A-Z, a-z, 0-9, _ or -'
+    if short_code in RESERVED_SHORT_CODES:
+        return None, None, f'short_code {short_code} is reserved'
+    return long_url, short_code, None
+
+
+class Importer:
+    def __init__(self, db, owner_id, errors_out):
+        self.db = db
+        self.owner_id = owner_id
+        self.errors_out = errors_out
+        self.read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.failed = 0
+
+    def error(self, line_num, reason):
+        self.failed += 1
+        self.errors_out.write(json.dumps({'line': line_num, 'error': reason}) + '\n')
+
+    async def import_chunk(self, chunk):
+        # chunk: list of (line number, long_url, short_code or None)
+        rows = {}
+        custom_codes = {}
+        for line_num, long_url, short_code in chunk:
+            key = normalize_url(long_url)
+            if key in rows:
+                self.duplicates += 1
+                continue
+            if short_code is not None:
+                if short_code in custom_codes:
+                    self.error(line_num, f'short_code {short_code} repeated in input')
+                    continue
+                custom_codes[short_code] = key
+            rows[key] = (line_num, long_url, short_code)
+
+        # The hash narrows the lookup; only the same normalised URL counts as a duplicate
+        existing = await select_in_chunks(self.db, [Urls.url], Urls.url_hash,
+                                          [hash_url(long_url) for line_num, long_url, short_code in rows.values()],
+                                          Urls.owner_id == self.owner_id)
+        for row in existing:
+            if rows.pop(normalize_url(row.url or ''), None) is not None:
+                self.duplicates += 1
+
+        await self.drop_taken_codes(rows, custom_codes)
+        await self.insert_rows(rows, custom_codes)
+
+    async def drop_taken_codes(self, rows, custom_codes):
+        # Report and remove rows whose custom short_code is already in the table
+        taken = await select_in_chunks(self.db, [Urls.short_code], Urls.short_code,
+                                       [code for code, key in custom_codes.items() if key in rows])
+        for row in taken:
+            line_num = rows.pop(custom_codes[row.short_code])[0]
+            self.error(line_num, f'short_code {row.short_code} already exists')
+
+    async def insert_rows(self, rows, custom_codes):
+        now = datetime.now(timezone.utc)
+        for attempt in range(3):
+            if not rows:
+                return
+            generated = [long_url for line_num, long_url, short_code in rows.values() if short_code is None]
+            codes = await code_generator.allocate(self.db, generated)
+            try:
+                await execute(self.db, insert(Urls), [
+                    {'url': long_url, 'url_hash': hash_url(long_url), 'short_code': short_code or codes[long_url],
+                     'access_count': 0, 'created_at': now, 'updated_at': now, 'owner_id': self.owner_id}
+                    for line_num, long_url, short_code in rows.values()
+                ])
+                await commit(self.db)
+                self.imported += len(rows)
+                return
+            except IntegrityError:
+                # A custom code was taken concurrently, or a generated code clashed with a new
+                # link; report the former and allocate again for the rest
+                await rollback(self.db)
+                await self.drop_taken_codes(rows, custom_codes)
+        for line_num, long_url, short_code in rows.values():
+            self.error(line_num, 'could not allocate a short code')
+
+
+async def run_import(stream, fmt, owner_id, chunk_size, errors_out, progress_out):
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        if (await execute(db, select(Users.id).where(Users.id == owner_id))).first() is None:
+            raise SystemExit(f'no user with id {owner_id}')
+        importer = Importer(db, owner_id, errors_out)
+        started = time.perf_counter()
+        chunk = []
+
+        async def flush():
+            await importer.import_chunk(chunk)
+            chunk.clear()
+            elapsed = time.perf_counter() - started
+            progress_out.write(f'read {importer.read:,}  imported {importer.imported:,}  '
+                               f'duplicates {importer.duplicates:,}  errors {importer.failed:,}  '
+                               f'({importer.read / elapsed:,.0f} rows/s)\n')
+
+        for line_num, record in read_records(stream, fmt):
+            importer.read += 1
+            long_url, short_code, reason = validate(record)
+            if reason:
+                importer.error(line_num, reason)
+                continue
+            chunk.append((line_num, long_url, short_code))
+            if len(chunk) >= chunk_size:
+                await flush()
+        if chunk:
+            await flush()
+        return importer
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import links from CSV or NDJSON.')
+    parser.add_argument('path', help="input file, or '-' for stdin")
+    parser.add_argument('--owner-id', type=int, required=True, help='user id that will own the links')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--errors', help='write per-row errors here as NDJSON (default: stderr)')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.path.endswith('.csv') else 'ndjson')
+    stream = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8')
+    errors_out = open(args.errors, 'w', encoding='utf-8') if args.errors else sys.stderr
+    try:
+        importer = asyncio.run(run_import(stream, fmt, args.owner_id, args.chunk_size, errors_out, sys.stderr))
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if errors_out is not sys.stderr:
+            errors_out.close()
+    print(json.dumps({'read': importer.read, 'imported': importer.imported,
+                      'duplicates': importer.duplicates, 'errors': importer.failed}))
+
+
+if __name__ == '__main__':
+    main()
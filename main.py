@@ -1,12 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from routers import urls, users, auth, admin
-import models
-from database import engine
-app = FastAPI()
+from migrations import upgrade_schema
+from database import engine, async_engine
+from click_counter import click_counter
+from short_code_filter import short_code_filter
+from url_cache import url_change_feed
+from click_log import click_log
+from password_hashing import password_hasher
+from user_deletion import user_deletions
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(short_code_filter.build)
+    await asyncio.to_thread(url_change_feed.start)
+    tasks = [
+        asyncio.create_task(click_counter.run()),
+        asyncio.create_task(short_code_filter.run()),
+        asyncio.create_task(url_change_feed.run()),
+    ]
+    click_log.start()
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await user_deletions.stop()
+    await click_log.stop()
+    # Final flush so no buffered clicks are lost on shutdown
+    await asyncio.to_thread(click_counter.flush)
+    await asyncio.to_thread(password_hasher.shutdown)
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+# orjson encodes the validated response models without the stdlib json round trip
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.include_router(urls.router)
 app.include_router(users.router)
 app.include_router(auth.router)
 app.include_router(admin.router)
-models.Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
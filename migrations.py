@@ -0,0 +1,160 @@
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, text, select, update, bindparam
+from sqlalchemy.schema import CreateTable
+
+import config
+from models import Base, Urls
+from url_utils import hash_url
+from search import create_search_index
+from url_cache import create_change_triggers
+
+BACKFILL_BATCH_SIZE = 5000
+# Bumped when the url_hash normalisation changes; stored in PRAGMA user_version
+URL_HASH_VERSION = 1
+
+
+@contextmanager
+def exclusive_connection(engine):
+    """One transaction holding SQLite's write lock for the whole upgrade.
+
+    Every worker runs upgrade_schema at startup. BEGIN IMMEDIATE makes the others
+    wait (up to MIGRATION_LOCK_TIMEOUT_MS) until the first one commits, and each step
+    re-checks the schema inside the lock, so later workers find nothing left to do.
+    pysqlite only wraps DML in its implicit transactions, so the BEGIN is issued by
+    hand with the driver in autocommit mode; DDL then rolls back with everything else.
+    """
+    if engine.dialect.name != 'sqlite':
+        with engine.begin() as conn:
+            yield conn
+        return
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        busy_timeout = conn.exec_driver_sql('PRAGMA busy_timeout').scalar()
+        conn.exec_driver_sql(f'PRAGMA busy_timeout = {config.MIGRATION_LOCK_TIMEOUT_MS}')
+        try:
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.exec_driver_sql('ROLLBACK')
+                raise
+            conn.exec_driver_sql('COMMIT')
+        finally:
+            conn.exec_driver_sql(f'PRAGMA busy_timeout = {busy_timeout}')
+
+
+def add_missing_columns(conn):
+    """Add columns declared on the models but missing from an existing SQLite file.
+
+    create_all only creates missing tables, so new nullable columns on existing
+    tables are added here with ALTER TABLE.
+    """
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def rebuild_urls_with_autoincrement(conn):
+    """Recreate an existing urls table with AUTOINCREMENT so deleted ids are never handed out again.
+
+    SQLite cannot add AUTOINCREMENT with ALTER TABLE, so rows are copied into a new
+    table with their ids. This runs inside upgrade_schema's exclusive transaction, so
+    the copy and swap commit together or not at all. Dropping the old table drops its
+    indexes and search triggers; create_missing_indexes and create_search_index put
+    them back.
+    """
+    if conn.dialect.name != 'sqlite':
+        return
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'urls'")).scalar()
+    if sql is None or 'AUTOINCREMENT' in sql.upper():
+        return
+    columns = ', '.join(column.name for column in Urls.__table__.columns)
+    create = str(CreateTable(Urls.__table__).compile(dialect=conn.dialect))
+    # Left behind by an interrupted rebuild from before upgrades ran in one transaction
+    conn.execute(text('DROP TABLE IF EXISTS urls_new'))
+    conn.execute(text(create.replace('CREATE TABLE urls', 'CREATE TABLE urls_new', 1)))
+    conn.execute(text(f'INSERT INTO urls_new ({columns}) SELECT {columns} FROM urls'))
+    conn.execute(text('DROP TABLE urls'))
+    conn.execute(text('ALTER TABLE urls_new RENAME TO urls'))
+
+
+def create_missing_indexes(conn):
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def backfill_url_hashes(conn):
+    """Fill urls.url_hash for rows created before the column existed, in batches."""
+    filled = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(Urls.id, Urls.url)
+            .where(Urls.id > last_id, Urls.url_hash.is_(None))
+            .order_by(Urls.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return filled
+        conn.execute(
+            update(Urls).where(Urls.id == bindparam('b_id'))
+            .values(url_hash=bindparam('b_hash'), updated_at=Urls.updated_at),
+            [{'b_id': row.id, 'b_hash': hash_url(row.url or '')} for row in rows],
+        )
+        filled += len(rows)
+        last_id = rows[-1].id
+
+
+def rehash_urls(conn):
+    """Recompute url_hash for rows whose normalised form changed since the stored version.
+
+    Version 1 keeps the URL fragment, so only rows containing '#' are affected.
+    """
+    if conn.dialect.name != 'sqlite':
+        return
+    if conn.exec_driver_sql('PRAGMA user_version').scalar() >= URL_HASH_VERSION:
+        return
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(Urls.id, Urls.url)
+            .where(Urls.id > last_id, Urls.url.like('%#%'))
+            .order_by(Urls.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            update(Urls).where(Urls.id == bindparam('b_id'))
+            .values(url_hash=bindparam('b_hash'), updated_at=Urls.updated_at),
+            [{'b_id': row.id, 'b_hash': hash_url(row.url)} for row in rows],
+        )
+        last_id = rows[-1].id
+    conn.exec_driver_sql(f'PRAGMA user_version = {URL_HASH_VERSION}')
+
+
+def upgrade_schema(engine):
+    with exclusive_connection(engine) as conn:
+        Base.metadata.create_all(bind=conn)
+        add_missing_columns(conn)
+        rebuild_urls_with_autoincrement(conn)
+        create_missing_indexes(conn)
+        backfill_url_hashes(conn)
+        rehash_urls(conn)
+        create_search_index(conn)
+        create_change_triggers(conn)
+
+
+if __name__ == '__main__':
+    from database import engine
+    upgrade_schema(engine)
@@ -1,17 +1,30 @@
 from datetime import datetime
 from database import Base
-from sqlalchemy import Integer, Column, String, DateTime, func, Boolean, ForeignKey
+from sqlalchemy import Integer, Column, String, DateTime, Date, func, Boolean, ForeignKey, LargeBinary, Index, text
 
 class Urls(Base):
     __tablename__ = 'urls'
+    __table_args__ = (
+        Index('ix_urls_owner_id_url_hash', 'owner_id', 'url_hash'),
+        # Keyset pagination orders by (sort column, id); SQLite appends the rowid to every index entry
+        Index('ix_urls_owner_id_created_at', 'owner_id', 'created_at'),
+        Index('ix_urls_owner_id_access_count', 'owner_id', 'access_count'),
+        Index('ix_urls_created_at', 'created_at'),
+        Index('ix_urls_access_count', 'access_count'),
+        # AUTOINCREMENT: ids are never reused, so other workers can sync new codes by id
+        {'sqlite_autoincrement': True},
+    )
 
     id = Column(Integer, primary_key=True,autoincrement=True ,index=True)
     url =  Column(String)
+    url_hash = Column(String(32))
     short_code = Column(String, unique=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     access_count = Column(Integer, default=0)
     owner_id = Column(Integer, ForeignKey('users.id'))
+    unique_visitors = Column(Integer, default=0)
+    visitor_sketch = Column(LargeBinary)
 
 
 
@@ -26,3 +39,86 @@ class Users(Base):
     hashed_password =Column(String)
     is_active = Column(Boolean, default=True)
     role =Column(String)
+
+
+class UrlChanges(Base):
+    # Short codes whose target changed or was deleted, written by triggers on urls.
+    # Each worker polls it by id to drop stale entries from its redirect cache.
+    __tablename__ = 'url_changes'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True)
+    short_code = Column(String, nullable=False)
+    changed_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+
+
+class ClickEvents(Base):
+    __tablename__ = 'click_events'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    url_id = Column(Integer, ForeignKey('urls.id'), index=True)
+    short_code = Column(String, nullable=False)
+    clicked_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    referrer = Column(String)
+    user_agent_hash = Column(String(16))
+    ip_prefix = Column(String)
+
+
+class ClickRollups(Base):
+    __tablename__ = 'click_rollups'
+
+    # Column order makes the primary key serve (url_id, granularity, time range) scans
+    url_id = Column(Integer, ForeignKey('urls.id'), primary_key=True)
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
+
+
+class UrlVisitorDays(Base):
+    __tablename__ = 'url_visitor_days'
+
+    url_id = Column(Integer, ForeignKey('urls.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    sketch = Column(LargeBinary, nullable=False)
+
+
+class CodeSequences(Base):
+    __tablename__ = 'code_sequences'
+
+    name = Column(String, primary_key=True)
+    next_value = Column(Integer, nullable=False)
+
+
+class ApiKeys(Base):
+    __tablename__ = 'api_keys'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    # Public lookup part of the key; the secret part is only stored as a keyed hash
+    prefix = Column(String(16), nullable=False, unique=True, index=True)
+    key_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    revoked_at = Column(DateTime(timezone=True))
+
+
+class DeletionJobs(Base):
+    # Progress of background user deletions, shared by every worker.
+    # No foreign key on user_id: the job outlives the user it deletes.
+    __tablename__ = 'deletion_jobs'
+    __table_args__ = (
+        # At most one unfinished job per user, whichever worker started it
+        Index('ux_deletion_jobs_active_user', 'user_id', unique=True, sqlite_where=text('finished_at IS NULL')),
+    )
+
+    id = Column(String(16), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    status = Column(String, nullable=False)
+    total_urls = Column(Integer)
+    deleted_urls = Column(Integer, nullable=False, default=0)
+    chunks = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # Bumped after every chunk; a job left unfinished and not updated for a while was abandoned
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime)
+    error = Column(String)
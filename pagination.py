@@ -0,0 +1,63 @@
+import base64
+import json
+from datetime import datetime
+
+from typing import Annotated, Literal
+
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+from starlette import status
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+PageLimit = Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)]
+SortOrder = Literal['asc', 'desc']
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({'s': sort, 'v': value, 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if payload['s'] != sort:
+            raise ValueError('cursor belongs to a different sort')
+        value = payload['v']
+        if sort == 'created_at' and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(payload['id'])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='invalid cursor')
+
+
+def keyset_page(statement, sort_column, id_column, sort: str, order: str, limit: int, cursor):
+    """Apply keyset ordering, the "after cursor" predicate and the page limit to a select.
+
+    Fetches limit + 1 rows so the caller can tell whether another page exists.
+    """
+    descending = order == 'desc'
+    if sort == 'id':
+        keys = [id_column]
+    else:
+        keys = [sort_column, id_column]
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort)
+        current = tuple_(*keys) if len(keys) > 1 else keys[0]
+        bound = tuple_(value, row_id) if len(keys) > 1 else row_id
+        statement = statement.where(current < bound if descending else current > bound)
+    return statement.order_by(*[key.desc() if descending else key.asc() for key in keys]).limit(limit + 1)
+
+
+def page_response(rows, items, sort: str, limit: int, sort_value):
+    """Build {'items', 'next_cursor'} from the limit + 1 rows returned by keyset_page."""
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(sort, sort_value(last), last.id)
+        items = items[:limit]
+    return {'items': items, 'next_cursor': next_cursor}
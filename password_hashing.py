@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+import config
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    """Runs bcrypt hash/verify on a dedicated bounded thread pool.
+
+    bcrypt releases the GIL while it works, so the event loop keeps serving
+    redirects while up to `workers` hashes run. At most `max_pending` calls may
+    be running or queued; beyond that callers get PasswordHasherBusy at once
+    instead of waiting behind a growing queue.
+    """
+
+    def __init__(self, context: CryptContext, workers: int, max_pending: int):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.run_time_total = 0.0
+
+    def _timed(self, submitted: float, fn, *args):
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                waited = started - submitted
+                self.queue_wait_total += waited
+                self.queue_wait_max = max(self.queue_wait_max, waited)
+                self.run_time_total += finished - started
+                self.completed += 1
+
+    async def _submit(self, fn, *args):
+        # pending is only changed on the event loop thread
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, time.monotonic(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._submit(self.context.verify, password, hashed)
+
+    def shutdown(self):
+        # Waits for in-flight hashes; the next call starts a fresh pool
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'completed': completed,
+                'rejected': self.rejected,
+                'avg_queue_wait_ms': self.queue_wait_total / completed * 1000 if completed else 0.0,
+                'max_queue_wait_ms': self.queue_wait_max * 1000,
+                'avg_run_ms': self.run_time_total / completed * 1000 if completed else 0.0,
+            }
+
+
+password_hasher = PasswordHasher(CryptContext(schemes=['bcrypt'], deprecated='auto'),
+                                 config.PASSWORD_HASH_WORKERS, config.PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,93 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+from starlette import status
+
+import config
+
+
+def parse_budget(budget: str):
+    """Parse '<requests>/<seconds>' into (requests, seconds)."""
+    requests, _, seconds = budget.partition('/')
+    requests, seconds = int(requests), float(seconds)
+    if requests < 1 or seconds <= 0:
+        raise ValueError(f'invalid rate limit budget {budget!r}')
+    return requests, seconds
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets, one (tokens, updated_at) pair per key.
+
+    A bucket holds up to `capacity` tokens and refills at capacity/period per
+    second. Keys are kept in last-used order; a bucket untouched for `period`
+    seconds is full again, so it is dropped without changing any decision.
+    `max_keys` caps memory if many keys are active at once.
+    """
+
+    def __init__(self, name: str, budget: str, max_keys: int, enabled: bool = True):
+        self.name = name
+        self.capacity, self.period = parse_budget(budget)
+        self.rate = self.capacity / self.period
+        self.max_keys = max_keys
+        self.enabled = enabled
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def _evict_idle(self, now: float):
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if now - updated_at < self.period:
+                return
+            del self._buckets[key]
+
+    def acquire(self, key: str) -> float:
+        """Take one token for key; return 0 if allowed, else seconds until one is available."""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            bucket = self._buckets.pop(key, None)
+            tokens = self.capacity if bucket is None else min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+                self.allowed += 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+            return wait
+
+    def check(self, key: str):
+        wait = self.acquire(key)
+        if wait:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail='rate limit exceeded',
+                                headers={'Retry-After': str(math.ceil(wait))})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'capacity': self.capacity,
+                'period': self.period,
+                'keys': len(self._buckets),
+                'allowed': self.allowed,
+                'limited': self.limited,
+                'evictions': self.evictions,
+            }
+
+
+login_limiter = TokenBucketLimiter('login', config.RATE_LIMIT_LOGIN, config.RATE_LIMIT_MAX_KEYS,
+                                   config.RATE_LIMIT_ENABLED)
+shorten_limiter = TokenBucketLimiter('shorten', config.RATE_LIMIT_SHORTEN, config.RATE_LIMIT_MAX_KEYS,
+                                     config.RATE_LIMIT_ENABLED)
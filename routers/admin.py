@@ -1,61 +1,265 @@
-from fastapi import Depends, HTTPException, Path, APIRouter
-from typing import Annotated
+import asyncio
+from datetime import datetime
+from fastapi import Depends, HTTPException, Path, APIRouter, Query
+from typing import Annotated, Literal
 from pydantic import BaseModel, Field
+import config
 from starlette import status
-from database import SessionLocal
+from database import get_db, execute
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Users, Urls
-from .auth import get_current_user, bcrypt_context
+from api_keys import api_key_cache
+from .auth import get_current_user
+from url_cache import url_cache, url_change_feed
+from click_counter import click_counter
+from short_code_filter import short_code_filter
+from click_log import click_log
+from password_hashing import password_hasher
+from token_cache import token_cache
+from rate_limit import login_limiter, shorten_limiter
+from user_deletion import user_deletions
+from bulk_ops import bulk_delete_urls, bulk_deactivate_users, url_criteria
+from trending import trending_links, parse_window
+from .urls import delete_urls, page_urls, summarize_urls, UrlSort, UrlSummarySchema, UrlPageSchema, URL_COLUMNS
+from fastapi.responses import StreamingResponse
+from exports import stream_rows, MEDIA_TYPES
+from pagination import DEFAULT_PAGE_SIZE, PageLimit, SortOrder, keyset_page, page_response
 
 router = APIRouter(
     prefix='/admin',
     tags=['admin']
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
-db_dependency = Annotated[Session,Depends(get_db)]
+class AdminUserSchema(BaseModel):
+    id: int
+    email: str | None
+    username: str | None
+    firstname: str | None
+    lastname: str | None
+    is_active: bool | None
+    role: str | None
+
+class UserPageSchema(BaseModel):
+    items: list[AdminUserSchema]
+    next_cursor: str | None
+
+class TrendingItemSchema(BaseModel):
+    short_code: str
+    clicks: int
+    error: int
+
+class TrendingResponseSchema(BaseModel):
+    window: str
+    k: int
+    items: list[TrendingItemSchema]
+
+class TopOwnerSchema(BaseModel):
+    owner_id: int
+    username: str | None
+    urls: int
+    clicks: int
+
+class DeletionJobSchema(BaseModel):
+    job_id: str
+    user_id: int
+    status: Literal['pending', 'running', 'completed', 'failed', 'interrupted']
+    total_urls: int | None
+    deleted_urls: int
+    chunks: int
+    started_at: datetime
+    finished_at: datetime | None
+    error: str | None
+
+class BulkFilterSchema(BaseModel):
+    # URL predicates, combined with AND
+    owner_id: int | None = None
+    host: str | None = Field(None, min_length=1, max_length=255)
+    created_before: datetime | None = None
+    zero_clicks: bool = False
+
+    def criteria(self):
+        return url_criteria(self.owner_id, self.host, self.created_before, self.zero_clicks)
+
+    def has_filter(self):
+        return self.owner_id is not None or self.host is not None or self.created_before is not None or self.zero_clicks
+
+class BulkDeleteUrlsSchema(BulkFilterSchema):
+    short_codes: list[str] | None = Field(None, min_length=1, max_length=config.BULK_MAX_ITEMS)
+
+class BulkDeactivateUsersSchema(BulkFilterSchema):
+    # The filters select users who own at least one matching link
+    user_ids: list[int] | None = Field(None, min_length=1, max_length=config.BULK_MAX_ITEMS)
+
+class BulkResultSchema(BaseModel):
+    affected: int
+    batches: int
+
+class AdminSummarySchema(BaseModel):
+    total_users: int
+    active_users: int
+    admins: int
+    urls: UrlSummarySchema
+    top_owners: list[TopOwnerSchema]
+
+db_dependency = Annotated[Session | AsyncSession,Depends(get_db)]
 user_dependency  = Annotated[dict  , Depends(get_current_user)]
 
-@router.get('/urls',status_code=status.HTTP_200_OK)
-async def fetch_all_urls(user:user_dependency, db:db_dependency):
+# Never select hashed_password for an admin listing
+USER_COLUMNS = [Users.id, Users.email, Users.username, Users.firstname, Users.lastname, Users.is_active, Users.role]
+
+@router.get('/urls',status_code=status.HTTP_200_OK, response_model=UrlPageSchema)
+async def fetch_all_urls(user:user_dependency, db:db_dependency, limit: PageLimit = DEFAULT_PAGE_SIZE,
+                         cursor: str | None = None, sort: UrlSort = 'created_at', order: SortOrder = 'desc'):
     if user is None or user.get('role') != 'admin':
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    return db.query(Urls).all()
+    return await page_urls(db, select(*URL_COLUMNS), sort, order, limit, cursor)
 
-@router.delete('/urls/{short_code}', status_code=status.HTTP_200_OK)
+@router.delete('/urls/{short_code}', status_code=status.HTTP_200_OK, response_model=str)
 async def delete_url(user:user_dependency, db:db_dependency, short_code:str):
     if user is None or user.get('role') != 'admin':
         raise HTTPException(satus_code=status.HTTP_401_UNAUTHORIZED)
-    rec_to_del = db.query(Urls).filter(Urls.short_code==short_code).first()
+    rec_to_del = (await execute(db, select(Urls.id, Urls.short_code).where(Urls.short_code==short_code))).first()
     if rec_to_del is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    db.query(Urls).filter(Urls.short_code==short_code).delete()
-    db.commit()
+    await delete_urls(db, [rec_to_del])
     return 'url deleted successfully'
 
 
-@router.get('/users', status_code=status.HTTP_200_OK)
-async def fetch_all_users(user: user_dependency, db: db_dependency):
+# A request with neither a list nor a filter would match every row, so it is rejected
+@router.post('/urls/bulk-delete', status_code=status.HTTP_200_OK, response_model=BulkResultSchema)
+async def bulk_delete(user: user_dependency, req: BulkDeleteUrlsSchema):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    if req.short_codes is None and not req.has_filter():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='short_codes or a filter is required')
+    try:
+        criteria = req.criteria()
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return await asyncio.to_thread(bulk_delete_urls, criteria, req.short_codes, req.zero_clicks)
+
+
+@router.post('/users/bulk-deactivate', status_code=status.HTTP_200_OK, response_model=BulkResultSchema)
+async def bulk_deactivate(user: user_dependency, req: BulkDeactivateUsersSchema):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    if req.user_ids is None and not req.has_filter():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='user_ids or a filter is required')
+    try:
+        criteria = req.criteria()
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if criteria:
+        criteria = [Users.id.in_(select(Urls.owner_id).where(*criteria))]
+    return await asyncio.to_thread(bulk_deactivate_users, criteria, req.user_ids)
+
+
+@router.get('/users', status_code=status.HTTP_200_OK, response_model=UserPageSchema)
+async def fetch_all_users(user: user_dependency, db: db_dependency, limit: PageLimit = DEFAULT_PAGE_SIZE,
+                          cursor: str | None = None, order: SortOrder = 'asc'):
     if user is None or user.get('role') != 'admin':
         raise HTTPException(satus_code=status.HTTP_401_UNAUTHORIZED)
-    return db.query(Users).all()
+    rows = (await execute(db, keyset_page(select(*USER_COLUMNS), None, Users.id, 'id', order, limit, cursor))).all()
+    return page_response(rows, [dict(row._mapping) for row in rows], 'id', limit, lambda rec: rec.id)
 
 
-@router.delete('/users/{userid}', status_code=status.HTTP_200_OK)
+@router.delete('/users/{userid}', status_code=status.HTTP_202_ACCEPTED, response_model=DeletionJobSchema)
 async def delete_user(user: user_dependency, db: db_dependency, userid: int):
     if user is None or user.get('role') != 'admin':
         raise HTTPException(satus_code=status.HTTP_401_UNAUTHORIZED)
-    rec_to_del = db.query(Users).filter(Users.id == userid).first()
+    rec_to_del = (await execute(db, select(Users.id).where(Users.id == userid))).first()
     if rec_to_del is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='no such user')
-    db.query(Urls).filter(Urls.owner_id==userid).delete()
-    db.query(Users).filter(Users.id == userid).delete()
-    db.commit()
-    return 'user deleted successfully'
+    # Links go in chunks from a background job; poll /admin/jobs/{job_id} for progress
+    return await user_deletions.start(userid)
+
 
+@router.get('/jobs/{job_id}', status_code=status.HTTP_200_OK, response_model=DeletionJobSchema)
+async def deletion_job_status(user: user_dependency, job_id: str):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    job = await asyncio.to_thread(user_deletions.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='no such job')
+    return job
+
+
+# Every column except the password hash and the binary visitor sketch
+USER_EXPORT_COLUMNS = [column for column in Users.__table__.columns if column.name != 'hashed_password']
+URL_EXPORT_COLUMNS = [column for column in Urls.__table__.columns if column.name != 'visitor_sketch']
+
+def export_response(statement, key, name, fmt, transform=None):
+    return StreamingResponse(stream_rows(statement, key, fmt, transform), media_type=MEDIA_TYPES[fmt],
+                             headers={'Content-Disposition': f'attachment; filename="{name}.{fmt}"'})
+
+def add_pending_clicks(record):
+    record['access_count'] = (record['access_count'] or 0) + click_counter.pending_for(record['short_code'])
+    return record
+
+
+@router.get('/export/urls', status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def export_urls(user: user_dependency, format: Literal['ndjson', 'csv'] = 'ndjson'):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return export_response(select(*URL_EXPORT_COLUMNS), Urls.id, 'urls', format, add_pending_clicks)
+
+
+@router.get('/export/users', status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def export_users(user: user_dependency, format: Literal['ndjson', 'csv'] = 'ndjson'):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return export_response(select(*USER_EXPORT_COLUMNS), Users.id, 'users', format)
+
+
+@router.get('/summary', status_code=status.HTTP_200_OK, response_model=AdminSummarySchema)
+async def fetch_summary(user: user_dependency, db: db_dependency, k: Annotated[int, Query(ge=1, le=100)] = 5):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    users = (await execute(db, select(func.count(Users.id).label('total_users'),
+                                      func.count(Users.id).filter(Users.is_active.is_(True)).label('active_users'),
+                                      func.count(Users.id).filter(Users.role == 'admin').label('admins')))).one()
+    # Flushes buffered clicks, so the owner totals below count them too
+    urls = await summarize_urls(db, k)
+    # Grouping walks the (owner_id, access_count) index; only the top k owners are joined to users
+    per_owner = (select(Urls.owner_id, func.count(Urls.id).label('urls'),
+                        func.coalesce(func.sum(Urls.access_count), 0).label('clicks'))
+                 .where(Urls.owner_id.is_not(None)).group_by(Urls.owner_id).order_by(func.sum(Urls.access_count).desc()).limit(k).subquery())
+    top_owners = (await execute(db, select(per_owner, Users.username)
+                                .outerjoin(Users, Users.id == per_owner.c.owner_id)
+                                .order_by(per_owner.c.clicks.desc()))).all()
+    return {
+        'total_users': users.total_users,
+        'active_users': users.active_users,
+        'admins': users.admins,
+        'urls': urls,
+        'top_owners': [{'owner_id': row.owner_id, 'username': row.username, 'urls': row.urls, 'clicks': row.clicks}
+                       for row in top_owners],
+    }
+
+
+@router.get('/trending', status_code=status.HTTP_200_OK, response_model=TrendingResponseSchema)
+async def fetch_trending(user: user_dependency, window: str = '5m', k: Annotated[int, Query(ge=1, le=500)] = 50):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    try:
+        window_seconds = parse_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if window_seconds > trending_links.max_buckets * trending_links.bucket_seconds:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='window is longer than the tracked history')
+    return {'window': window, 'k': k, 'items': trending_links.top(window_seconds, k)}
+
+
+@router.get('/metrics', status_code=status.HTTP_200_OK, response_model=dict[str, dict])
+async def fetch_metrics(user: user_dependency):
+    if user is None or user.get('role') != 'admin':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return {'url_cache': url_cache.stats(), 'url_change_feed': url_change_feed.stats(), 'click_counter': click_counter.stats(),
+            'short_code_filter': short_code_filter.stats(),
+            'click_log': click_log.stats(), 'password_hasher': password_hasher.stats(),
+            'token_cache': token_cache.stats(), 'api_key_cache': api_key_cache.stats(),
+            'user_deletions': user_deletions.stats(),
+            'rate_limits': {limiter.name: limiter.stats() for limiter in (login_limiter, shorten_limiter)}}
@@ -1,40 +1,33 @@
 from datetime import timedelta, timezone, datetime
 from fastapi import HTTPException
 from typing import Annotated
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from database import SessionLocal
+from database import get_db, execute, commit, rollback
 from models import Users
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
-from dotenv import load_dotenv
-import os
-from pathlib import Path
+import config
+from password_hashing import password_hasher, PasswordHasherBusy
+from token_cache import token_cache
+from api_keys import is_api_key, authenticate_api_key
+from rate_limit import login_limiter
 
-env_path = Path(__file__).resolve().parent.parent / '.env'
-load_dotenv(dotenv_path=env_path)
 router = APIRouter(
     prefix='/auth',
     tags=['auth']
 )
-bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated = 'auto')
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl='auth/token')
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
+SECRET_KEY = config.SECRET_KEY
+ALGORITHM = config.ALGORITHM
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-db_dependency = Annotated[Session,Depends(get_db)]
+db_dependency = Annotated[Session | AsyncSession,Depends(get_db)]
 
 
 
@@ -52,11 +45,35 @@ class TokenResponse(BaseModel):
 
 
 
-def authenticate_user(username:str, password:str, db):
-    user = db.query(Users).filter(Users.username == username).first()
+def password_service_busy():
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='password service busy, retry shortly',
+                         headers={'Retry-After': '1'})
+
+# bcrypt runs on the password_hasher pool, never on the event loop
+async def hash_password(password:str):
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise password_service_busy()
+
+async def verify_password(password:str, hashed_password:str):
+    try:
+        return await password_hasher.verify(password, hashed_password)
+    except PasswordHasherBusy:
+        raise password_service_busy()
+
+async def password_rate_limit(request: Request):
+    # Registration and login share one per-IP budget since both cost a bcrypt call
+    login_limiter.check(request.client.host if request.client else 'unknown')
+
+async def authenticate_user(username:str, password:str, db):
+    user = (await execute(db, select(Users.id, Users.username, Users.role, Users.hashed_password)
+                          .where(Users.username == username, Users.is_active.isnot(False)))).first()
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    # End the read transaction so no SQLite lock is held while bcrypt runs
+    await rollback(db)
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
@@ -67,6 +84,16 @@ def create_access_token(username:str, user_id:int, user_role:str, expires_delta:
     return jwt.encode(encode, SECRET_KEY, algorithm= ALGORITHM)
 
 async def get_current_user(token:Annotated[str,Depends(oauth2_bearer)]):
+    # API keys arrive as bearer tokens too and resolve to the same claims
+    if is_api_key(token):
+        user = await authenticate_api_key(token)
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
+        return user
+    # Clients reuse a token for its whole life; only the first use pays for jwt.decode
+    cached = token_cache.get(token, SECRET_KEY, ALGORITHM)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get('sub')
@@ -74,31 +101,33 @@ async def get_current_user(token:Annotated[str,Depends(oauth2_bearer)]):
         user_role = payload.get('user_role')
         if userid is None or username is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
-        return {'username':username, 'id': userid,'role':user_role}
+        user = {'username':username, 'id': userid,'role':user_role}
+        token_cache.set(token, SECRET_KEY, ALGORITHM, user, payload.get('exp'))
+        return user
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
 
 
 
 
-@router.post('/',status_code=status.HTTP_201_CREATED)
+@router.post('/',status_code=status.HTTP_201_CREATED, response_model=None, dependencies=[Depends(password_rate_limit)])
 async def create_user(db:db_dependency,userreq:CreateUserRequest):
     new_user = Users(
         email = userreq.email,
         username = userreq.username,
         firstname = userreq.firstname,
         lastname = userreq.lastname,
-        hashed_password=bcrypt_context.hash(userreq.password),
+        hashed_password=await hash_password(userreq.password),
         role = userreq.role,
         is_active = True
     )
     db.add(new_user)
-    db.commit()
+    await commit(db)
 
 
-@router.post('/token', response_model=TokenResponse)
+@router.post('/token', response_model=TokenResponse, dependencies=[Depends(password_rate_limit)])
 async def login_for_access_token(formdata: Annotated[OAuth2PasswordRequestForm,Depends()], db:db_dependency):
-    user = authenticate_user(formdata.username, formdata.password,db)
+    user = await authenticate_user(formdata.username, formdata.password,db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='could not validate user')
     token = create_access_token(user.username, user.id,user.role,timedelta(minutes=20) )
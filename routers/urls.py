@@ -1,14 +1,29 @@
-import hashlib
-import base64
-from typing import Annotated
+import asyncio
+from typing import Annotated, Literal
 from starlette import status
-from fastapi import FastAPI, APIRouter, Depends, HTTPException
-from pydantic import BaseModel
-from datetime import datetime, timezone
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Query
+from pydantic import BaseModel, Field
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import Urls
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, execute, commit, rollback, fetch_scalar, select_in_chunks
+from models import Urls, ClickRollups, UrlVisitorDays
+from hyperloglog import HyperLogLog
+import config
 from routers.auth import get_current_user
+from url_cache import url_cache
+from bulk_ops import url_delete_statements, forget_url_rows
+from click_counter import click_counter
+from short_code_filter import short_code_filter
+from click_log import click_log, bucket_start
+from trending import trending_links
+from short_codes import code_generator
+from url_utils import hash_url, normalize_url
+from pagination import DEFAULT_PAGE_SIZE, PageLimit, SortOrder, keyset_page, page_response
+from search import urls_fts, match_expression
+from rate_limit import shorten_limiter
 from fastapi.responses import RedirectResponse
 
 router = APIRouter(
@@ -16,15 +31,7 @@ router = APIRouter(
     tags=['urls']
 )
 
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-db_dependency = Annotated[Session,Depends(get_db)]
+db_dependency = Annotated[Session | AsyncSession,Depends(get_db)]
 user_dependency  = Annotated[dict  , Depends(get_current_user)]
 
 now = datetime.now(timezone.utc)
@@ -44,108 +51,339 @@ class CreatedReponseSchema(BaseModel):
     class Config:
         orm_mode = True
 
+class UrlSchema(CreatedReponseSchema):
+    owner_id: int | None
+    unique_visitors: int
+
+class UrlPageSchema(BaseModel):
+    items: list[UrlSchema]
+    next_cursor: str | None
+
+class MessageResponseSchema(BaseModel):
+    message: str
+
+class BatchCreateRequestSchema(BaseModel):
+    long_urls: list[str] = Field(min_length=1, max_length=config.BATCH_SHORTEN_MAX)
+
+class BatchItemSchema(BaseModel):
+    long_url: str
+    status: Literal['created', 'existing']
+    id: int
+    short_code: str
+
+class BatchCreateResponseSchema(BaseModel):
+    created: int
+    existing: int
+    items: list[BatchItemSchema]
+
+class StatsBucketSchema(BaseModel):
+    bucket_start: datetime
+    clicks: int
+
+class StatsResponseSchema(BaseModel):
+    short_code: str
+    granularity: str
+    start: datetime
+    end: datetime
+    total: int
+    unique_visitors: int
+    series: list[StatsBucketSchema]
+
+class TopUrlSchema(BaseModel):
+    short_code: str
+    url: str
+    access_count: int
+
+class UrlSummarySchema(BaseModel):
+    total_urls: int
+    total_clicks: int
+    active_urls: int
+    avg_clicks: float
+    top: list[TopUrlSchema]
+
 class FetchShortResponseSchema(BaseModel):
     url:str
     class Config:
         orm_mode = True
 
 
-def create_short_code(long_url: str, salt: str = '', length: int = 8) -> str:
-    # Include salt in the hash to avoid collision
-    input_str = long_url + salt
-    hash_object = hashlib.sha256(input_str.encode())
-    b64_encoded = base64.urlsafe_b64encode(hash_object.digest()).decode()
-    return b64_encoded[:length]
-
-def increment_access_count(short_code:str, db):
-    url = db.query(Urls).filter(Urls.short_code==short_code).first()
-    if url is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    url.access_count +=1
-    db.commit()
-
-
-
-@router.get('/', status_code=status.HTTP_200_OK)
-async def see_all_urls(user:user_dependency,db:db_dependency):
+async def lookup_long_url(short_code: str):
+    # Core-level lookup of the url column only, no Session or ORM identity map
+    return await fetch_scalar(select(Urls.url).where(Urls.short_code == short_code))
+
+CODE_INSERT_ATTEMPTS = 3
+
+# Routes read these columns instead of whole Urls entities
+URL_COLUMNS = [Urls.id, Urls.url, Urls.short_code, Urls.created_at, Urls.updated_at,
+               Urls.access_count, Urls.owner_id, Urls.unique_visitors]
+
+async def shorten_rate_limit(user:user_dependency):
+    # Each create is a write transaction; batches count as one request
+    if user is not None:
+        shorten_limiter.check(f"user:{user.get('id')}")
+
+UrlSort = Literal['created_at', 'access_count', 'id']
+
+async def summarize_urls(db, k, *criteria):
+    # Write buffered clicks first so the totals and the top-K are both read from the table
+    # and agree with each other; clicks arriving after this show up on the next request
+    await asyncio.to_thread(click_counter.flush)
+    # One aggregate pass and one top-K read, both over the access_count indexes
+    totals = (await execute(db, select(func.count(Urls.id).label('total_urls'),
+                                       func.coalesce(func.sum(Urls.access_count), 0).label('total_clicks'),
+                                       func.count(Urls.id).filter(Urls.access_count > 0).label('active_urls'))
+                            .where(*criteria))).one()
+    top = (await execute(db, select(Urls.short_code, Urls.url, Urls.access_count).where(*criteria)
+                         .order_by(Urls.access_count.desc(), Urls.id.desc()).limit(k))).all()
+    return {
+        'total_urls': totals.total_urls,
+        'total_clicks': totals.total_clicks,
+        'active_urls': totals.active_urls,
+        'avg_clicks': totals.total_clicks / totals.total_urls if totals.total_urls else 0.0,
+        'top': [{'short_code': row.short_code, 'url': row.url, 'access_count': row.access_count or 0} for row in top],
+    }
+
+async def page_urls(db, statement, sort, order, limit, cursor):
+    # Cursors carry the stored access_count, not the one with pending clicks added
+    sort_column = getattr(Urls, sort)
+    rows = (await execute(db, keyset_page(statement, sort_column, Urls.id, sort, order, limit, cursor))).all()
+    return page_response(rows, with_pending_clicks(rows), sort, limit, lambda rec: getattr(rec, sort))
+
+def with_pending_clicks(records):
+    # access_count in the table lags behind the write-behind click buffer
+    rows = []
+    for rec in records:
+        row = dict(rec._mapping)
+        row['access_count'] = (row['access_count'] or 0) + click_counter.pending_for(rec.short_code)
+        row['unique_visitors'] = row['unique_visitors'] or 0
+        rows.append(row)
+    return rows
+
+def to_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+async def delete_urls(db, rows):
+    # Same cascade as the bulk and user deletions; caches are updated once the delete commits
+    for statement in url_delete_statements([row.id for row in rows]):
+        await execute(db, statement)
+    await commit(db)
+    forget_url_rows(rows)
+
+
+
+@router.get('/', status_code=status.HTTP_200_OK, response_model=UrlPageSchema)
+async def see_all_urls(user:user_dependency,db:db_dependency, limit: PageLimit = DEFAULT_PAGE_SIZE,
+                       cursor: str | None = None, sort: UrlSort = 'created_at', order: SortOrder = 'desc'):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='you are not an existing user')
-    return db.query(Urls).filter(Urls.owner_id==user.get('id')).all()
-
-
-
-
-@router.get('/{short_code}')
-async def redirect_to_long_url(db: db_dependency, short_code: str):
-    req_url = db.query(Urls).filter(Urls.short_code == short_code).first()
+    return await page_urls(db, select(*URL_COLUMNS).where(Urls.owner_id==user.get('id')), sort, order, limit, cursor)
 
-    if req_url is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    increment_access_count(short_code, db)
+@router.get('/summary', status_code=status.HTTP_200_OK, response_model=UrlSummarySchema)
+async def urls_summary(user:user_dependency, db:db_dependency, k: Annotated[int, Query(ge=1, le=100)] = 5):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='you are not an existing user')
+    return await summarize_urls(db, k, Urls.owner_id==user.get('id'))
 
-    return RedirectResponse(url=req_url.url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
 
+@router.get('/search', status_code=status.HTTP_200_OK, response_model=UrlPageSchema)
+async def search_urls(user:user_dependency, db:db_dependency, q: Annotated[str, Query(min_length=1, max_length=200)],
+                      limit: PageLimit = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='you are not an existing user')
+    match = match_expression(q, user.get('id'))
+    if match is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='query has no searchable terms')
+    # Rank and page inside the FTS index, then join only the page's rows to urls
+    hits = keyset_page(select(urls_fts.c.rowid, urls_fts.c.rank).where(match),
+                       urls_fts.c.rank, urls_fts.c.rowid, 'rank', 'asc', limit, cursor).subquery()
+    rows = (await execute(db, select(*URL_COLUMNS, hits.c.rank).join_from(hits, Urls, Urls.id == hits.c.rowid)
+                          .order_by(hits.c.rank, hits.c.rowid))).all()
+    return page_response(rows, with_pending_clicks(rows), 'rank', limit, lambda rec: rec.rank)
+
+
+@router.get('/{short_code}/stats', status_code=status.HTTP_200_OK, response_model=StatsResponseSchema)
+async def url_stats(user:user_dependency, db:db_dependency, short_code:str,
+                    start: Annotated[datetime | None, Query(alias='from')] = None,
+                    end: Annotated[datetime | None, Query(alias='to')] = None,
+                    granularity: Literal['hour', 'day'] = 'hour'):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='you are not an existing user')
+    rec = (await execute(db, select(Urls.id).where(Urls.short_code==short_code, Urls.owner_id==user.get('id')))).first()
+    if rec is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No such short URL found')
 
-@router.post('/', status_code=status.HTTP_201_CREATED, response_model=CreatedReponseSchema)
+    end = to_naive_utc(end) if end else datetime.now(timezone.utc).replace(tzinfo=None)
+    start = to_naive_utc(start) if start else end - (timedelta(days=2) if granularity == 'hour' else timedelta(days=30))
+    # Include the bucket that contains `from`, not just the buckets starting after it
+    start = bucket_start(start.replace(tzinfo=timezone.utc), granularity)
+    rows = (await execute(db, select(ClickRollups.bucket_start, ClickRollups.clicks)
+                          .where(ClickRollups.url_id==rec.id, ClickRollups.granularity==granularity,
+                                 ClickRollups.bucket_start >= start, ClickRollups.bucket_start <= end)
+                          .order_by(ClickRollups.bucket_start))).all()
+    # Daily sketches merge into one estimate for the whole range
+    visitors = HyperLogLog(config.HLL_PRECISION)
+    sketches = (await execute(db, select(UrlVisitorDays.sketch)
+                              .where(UrlVisitorDays.url_id==rec.id,
+                                     UrlVisitorDays.day >= start.date(), UrlVisitorDays.day <= end.date()))).scalars()
+    for sketch in sketches:
+        visitors.merge(HyperLogLog.from_bytes(sketch))
+    return {
+        'short_code': short_code,
+        'granularity': granularity,
+        'start': start,
+        'end': end,
+        'total': sum(row.clicks for row in rows),
+        'unique_visitors': visitors.count(),
+        'series': [{'bucket_start': row.bucket_start, 'clicks': row.clicks} for row in rows],
+    }
+
+
+@router.get('/{short_code}', response_class=RedirectResponse, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+async def redirect_to_long_url(request: Request, short_code: str):
+    long_url = url_cache.get(short_code)
+    if long_url is None:
+        if not short_code_filter.might_contain(short_code):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        # An update or delete that invalidates while we read makes set() drop the stale value
+        generation = url_cache.generation
+        long_url = await lookup_long_url(short_code)
+
+        if long_url is None:
+            short_code_filter.record_false_positive()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        url_cache.set(short_code, long_url, generation)
+
+    click_counter.record(short_code)
+    trending_links.record(short_code)
+    await click_log.publish(short_code, request.headers.get('referer'), request.headers.get('user-agent'),
+                            request.client.host if request.client else None)
+
+    return RedirectResponse(url=long_url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+
+@router.post('/', status_code=status.HTTP_201_CREATED, response_model=CreatedReponseSchema,
+             dependencies=[Depends(shorten_rate_limit)])
 async def shorten_url(user:user_dependency,db: db_dependency, urlreq: CreateRequestSchema):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='you are not an existing user')
     # Check if this long URL is already shortened
-    existing_url = db.query(Urls).filter(Urls.url == urlreq.long_url).filter(Urls.owner_id==user.get('id')).first()
+    url_hash = hash_url(urlreq.long_url)
+    normalized = normalize_url(urlreq.long_url)
+    candidates = (await execute(db, select(*URL_COLUMNS).where(Urls.owner_id==user.get('id'), Urls.url_hash == url_hash))).all()
+    # The hash only narrows the search; a link is reused only for the same normalised URL
+    existing_url = next((row for row in candidates if normalize_url(row.url or '') == normalized), None)
     if existing_url:
-        return existing_url
+        return with_pending_clicks([existing_url])[0]
 
     now = datetime.now(timezone.utc)
-    short_url = create_short_code(urlreq.long_url)
-
-    # Check if short_code already exists (rare, but possible collision)
-    attempt = 1
-    while db.query(Urls).filter(Urls.short_code == short_url).first():
-        short_url = create_short_code(urlreq.long_url, salt=str(attempt))
-        attempt += 1
-
-    new_url = Urls(
-        url=urlreq.long_url,
-        short_code=short_url,
-        access_count=0,
-        created_at=now,
-        updated_at=now,
-        owner_id = user.get('id')
-    )
-
-    db.add(new_url)
-    db.commit()
-    db.refresh(new_url)
+
+    # The unique index on short_code is the final arbiter if another worker
+    # or an imported custom code took the code first
+    for attempt in range(CODE_INSERT_ATTEMPTS):
+        short_url = (await code_generator.allocate(db, [urlreq.long_url]))[urlreq.long_url]
+        try:
+            new_url = (await execute(db, insert(Urls).values(
+                url=urlreq.long_url,
+                url_hash=url_hash,
+                short_code=short_url,
+                access_count=0,
+                created_at=now,
+                updated_at=now,
+                owner_id = user.get('id')
+            ).returning(*URL_COLUMNS))).one()
+            await commit(db)
+            break
+        except IntegrityError:
+            await rollback(db)
+            if attempt == CODE_INSERT_ATTEMPTS - 1:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='could not allocate a short code')
+    short_code_filter.add(short_url)
 
     return new_url
 
 
-@router.delete('/{short_code}',status_code=status.HTTP_200_OK)
+@router.post('/batch', status_code=status.HTTP_201_CREATED, response_model=BatchCreateResponseSchema,
+             dependencies=[Depends(shorten_rate_limit)])
+async def shorten_urls_batch(user:user_dependency, db:db_dependency, batchreq:BatchCreateRequestSchema):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='you are not an existing user')
+    owner_id = user.get('id')
+    normalized = {long_url: normalize_url(long_url) for long_url in batchreq.long_urls}
+    # First spelling of each normalised URL is the one stored
+    unique_urls = {}
+    for long_url, key in normalized.items():
+        unique_urls.setdefault(key, long_url)
+
+    # One set-based dedupe against the caller's existing links; the hash narrows the
+    # lookup and the normalised URL decides the match
+    results = {}
+    for row in await select_in_chunks(db, [Urls.id, Urls.url, Urls.short_code], Urls.url_hash,
+                                      [hash_url(long_url) for long_url in unique_urls.values()],
+                                      Urls.owner_id == owner_id):
+        key = normalize_url(row.url or '')
+        if key in unique_urls:
+            results.setdefault(key, {'status': 'existing', 'id': row.id, 'short_code': row.short_code})
+
+    new_urls = [long_url for key, long_url in unique_urls.items() if key not in results]
+    if new_urls:
+        now = datetime.now(timezone.utc)
+        for attempt in range(CODE_INSERT_ATTEMPTS):
+            codes = await code_generator.allocate(db, new_urls)
+            try:
+                inserted = await execute(db, insert(Urls).returning(Urls.id, Urls.url), [
+                    {'url': long_url, 'url_hash': hash_url(long_url), 'short_code': codes[long_url], 'access_count': 0,
+                     'created_at': now, 'updated_at': now, 'owner_id': owner_id}
+                    for long_url in new_urls
+                ])
+                rows = inserted.all()
+                await commit(db)
+                break
+            except IntegrityError:
+                await rollback(db)
+                if attempt == CODE_INSERT_ATTEMPTS - 1:
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='could not allocate short codes')
+        for row in rows:
+            results[normalized[row.url]] = {'status': 'created', 'id': row.id, 'short_code': codes[row.url]}
+        for long_url in new_urls:
+            short_code_filter.add(codes[long_url])
+
+    items = [{'long_url': long_url, **results[normalized[long_url]]} for long_url in batchreq.long_urls]
+    return {
+        'created': len(new_urls),
+        'existing': len(unique_urls) - len(new_urls),
+        'items': items,
+    }
+
+
+@router.delete('/{short_code}',status_code=status.HTTP_200_OK, response_model=MessageResponseSchema)
 async def delete_record(user:user_dependency,db:db_dependency, short_code:str):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='you are not an existing user')
-    rec_to_delete = db.query(Urls).filter(Urls.short_code==short_code).filter(Urls.owner_id==user.get('id')).first()
+    rec_to_delete = (await execute(db, select(Urls.id, Urls.short_code).where(Urls.short_code==short_code, Urls.owner_id==user.get('id')))).first()
     if rec_to_delete is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No such short URL found')
 
-    db.query(Urls).filter(Urls.short_code==short_code).filter(Urls.owner_id==user.get('id')).delete()
-    db.commit()
+    await delete_urls(db, [rec_to_delete])
     return {'message':'deleted successfully'}
 
 
 
-@router.put('/{short_code}',status_code = status.HTTP_200_OK)
+@router.put('/{short_code}',status_code = status.HTTP_200_OK, response_model=UrlSchema)
 async def update_record(user:user_dependency,db:db_dependency, short_code:str, updatereq:CreateRequestSchema):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail='you are not an existing user')
-    rec_to_update = db.query(Urls).filter(Urls.short_code==short_code).filter(Urls.owner_id==user.get('id')).first()
+    rec_to_update = (await execute(db, update(Urls)
+                                   .where(Urls.short_code==short_code, Urls.owner_id==user.get('id'))
+                                   .values(url=updatereq.long_url, url_hash=hash_url(updatereq.long_url),
+                                           updated_at=datetime.now(timezone.utc))
+                                   .returning(*URL_COLUMNS))).first()
     if rec_to_update is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No such short URL found')
-    rec_to_update.url = updatereq.long_url
-    rec_to_update.updated_at = datetime.now(timezone.utc)
 
-    db.commit()
-    db.refresh(rec_to_update)
+    await commit(db)
+    url_cache.invalidate(short_code)
 
-    return rec_to_update
\ No newline at end of file
+    return with_pending_clicks([rec_to_update])[0]
\ No newline at end of file
@@ -1,25 +1,23 @@
 from fastapi import Depends, HTTPException, Path, APIRouter
 from typing import Annotated
+from datetime import datetime, timezone
 from pydantic import BaseModel, Field
 from starlette import status
-from database import SessionLocal
+from database import get_db, execute, commit, rollback
+from sqlalchemy import select, update, insert, func
 from sqlalchemy.orm import Session
-from models import Users
-from .auth import get_current_user, bcrypt_context
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Users, ApiKeys
+from api_keys import generate_api_key, hash_api_key, api_key_cache
+import config
+from .auth import get_current_user, hash_password, verify_password
 
 router = APIRouter(
     prefix='/users',
     tags=['users']
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-db_dependency = Annotated[Session,Depends(get_db)]
+db_dependency = Annotated[Session | AsyncSession,Depends(get_db)]
 user_dependency  = Annotated[dict  , Depends(get_current_user)]
 
 
@@ -30,6 +28,23 @@ class UserResponseModel(BaseModel):
     username:str
     role:str
 
+class MessageResponseSchema(BaseModel):
+    message: str
+
+class ApiKeyRequest(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+
+class ApiKeySchema(BaseModel):
+    id: int
+    name: str
+    prefix: str
+    created_at: datetime
+    revoked_at: datetime | None
+
+class CreatedApiKeySchema(ApiKeySchema):
+    # The only time the full key is returned
+    key: str
+
 class UserVerification(BaseModel):
     password:str
     new_password : str =Field(min_length=6)
@@ -41,31 +56,70 @@ async def user_details(user: user_dependency, db:db_dependency):
     user_id = user.get('id')
     if user_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    user_details = db.query(Users).filter(Users.id == user_id).first()
-    return {
-        'id':user_details.id,
-        'firstname':user_details.firstname,
-        'lastname':user_details.lastname,
-        'username': user_details.username,
-        'role': user_details.role
-    }
-
-@router.put('/password', status_code=status.HTTP_200_OK)
+    user_details = (await execute(db, select(Users.id, Users.firstname, Users.lastname, Users.username, Users.role)
+                                  .where(Users.id == user_id))).first()
+    if user_details is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return user_details._mapping
+
+@router.put('/password', status_code=status.HTTP_200_OK, response_model=MessageResponseSchema)
 async def update_password(user: user_dependency, db: db_dependency, user_verification: UserVerification):
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
-    user_to_update = db.query(Users).filter(Users.id == user.get('id')).first()
+    user_to_update = (await execute(db, select(Users.id, Users.hashed_password).where(Users.id == user.get('id')))).first()
 
     if user_to_update is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # No SQLite lock is held across the two bcrypt calls
+    await rollback(db)
 
-    if not bcrypt_context.verify(user_verification.password, user_to_update.hashed_password):
+    if not await verify_password(user_verification.password, user_to_update.hashed_password):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
 
-    user_to_update.hashed_password = bcrypt_context.hash(user_verification.new_password)
-    db.add(user_to_update)
-    db.commit()
-    db.refresh(user_to_update)
+    await execute(db, update(Users).where(Users.id == user_to_update.id)
+                  .values(hashed_password=await hash_password(user_verification.new_password)))
+    await commit(db)
 
     return {'message': 'Password updated successfully'}
+
+
+API_KEY_COLUMNS = [ApiKeys.id, ApiKeys.name, ApiKeys.prefix, ApiKeys.created_at, ApiKeys.revoked_at]
+
+@router.get('/api-keys', response_model=list[ApiKeySchema], status_code=status.HTTP_200_OK)
+async def list_api_keys(user: user_dependency, db: db_dependency):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    rows = (await execute(db, select(*API_KEY_COLUMNS).where(ApiKeys.user_id == user.get('id'))
+                          .order_by(ApiKeys.id))).all()
+    return [row._mapping for row in rows]
+
+@router.post('/api-keys', response_model=CreatedApiKeySchema, status_code=status.HTTP_201_CREATED)
+async def create_api_key(user: user_dependency, db: db_dependency, keyreq: ApiKeyRequest):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    live_keys = (await execute(db, select(func.count(ApiKeys.id))
+                               .where(ApiKeys.user_id == user.get('id'), ApiKeys.revoked_at.is_(None)))).scalar()
+    if live_keys >= config.API_KEYS_PER_USER:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='API key limit reached, revoke one first')
+    key, prefix = generate_api_key()
+    row = (await execute(db, insert(ApiKeys).values(user_id=user.get('id'), name=keyreq.name, prefix=prefix,
+                                                    key_hash=hash_api_key(key), created_at=datetime.now(timezone.utc))
+                         .returning(*API_KEY_COLUMNS))).one()
+    await commit(db)
+    return {**row._mapping, 'key': key}
+
+@router.delete('/api-keys/{key_id}', response_model=MessageResponseSchema, status_code=status.HTTP_200_OK)
+async def revoke_api_key(user: user_dependency, db: db_dependency, key_id: int = Path(gt=0)):
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    revoked = (await execute(db, update(ApiKeys)
+                             .where(ApiKeys.id == key_id, ApiKeys.user_id == user.get('id'), ApiKeys.revoked_at.is_(None))
+                             .values(revoked_at=datetime.now(timezone.utc))
+                             .returning(ApiKeys.prefix))).first()
+    if revoked is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No such active API key')
+    await commit(db)
+    # Other workers drop it when their cached entry expires (API_KEY_CACHE_TTL)
+    api_key_cache.invalidate(revoked.prefix)
+    return {'message': 'API key revoked'}
@@ -0,0 +1,79 @@
+"""SQLite FTS5 index over each link's short code, host and path.
+
+`urls_fts` is kept in step with `urls` by triggers, so every write path (the
+API, batch shortening, the import CLI, deletes) updates it without extra code.
+Rows carry an `owner` token ('u<owner_id>') that every query is ANDed with, so
+a search only ever walks the caller's own links.
+"""
+import re
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, literal_column, text
+
+# Kept out of Base.metadata: create_all cannot build virtual tables
+urls_fts = Table(
+    'urls_fts', MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('short_code', String),
+    Column('host', String),
+    Column('path', String),
+    Column('owner', String),
+    Column('rank', Float),
+)
+
+MAX_QUERY_TERMS = 8
+TERM_PATTERN = re.compile(r'\w+')
+
+# Short code matches outrank host matches, which outrank path matches
+RANK_FUNCTION = 'bm25(10.0, 5.0, 1.0, 0.0)'
+
+# Splits url into host and path in SQL so triggers need no Python functions
+INDEX_ROWS_SQL = """
+INSERT INTO urls_fts(rowid, short_code, host, path, owner)
+SELECT id, short_code, substr(rest, 1, host_length), substr(rest, host_length + 1), 'u' || owner_id
+FROM (SELECT id, short_code, owner_id, rest,
+             CASE WHEN instr(rest, '/') > 0 THEN instr(rest, '/') - 1 ELSE length(rest) END AS host_length
+      FROM (SELECT id, short_code, owner_id,
+                   CASE WHEN instr(url, '://') > 0 THEN substr(url, instr(url, '://') + 3) ELSE url END AS rest
+            FROM ({source})))
+"""
+TRIGGER_SOURCE = 'SELECT new.id AS id, new.url AS url, new.short_code AS short_code, new.owner_id AS owner_id'
+
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS urls_fts_insert AFTER INSERT ON urls BEGIN
+        {INDEX_ROWS_SQL.format(source=TRIGGER_SOURCE)};
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS urls_fts_delete AFTER DELETE ON urls BEGIN
+        DELETE FROM urls_fts WHERE rowid = old.id;
+    END""",
+    # Click flushes only touch access_count, so they never fire this
+    f"""CREATE TRIGGER IF NOT EXISTS urls_fts_update AFTER UPDATE OF url, short_code, owner_id ON urls BEGIN
+        DELETE FROM urls_fts WHERE rowid = old.id;
+        {INDEX_ROWS_SQL.format(source=TRIGGER_SOURCE)};
+    END""",
+]
+
+
+def create_search_index(conn):
+    """Create urls_fts and its triggers, indexing existing links the first time."""
+    if conn.dialect.name != 'sqlite':
+        return
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'urls_fts'")).first()
+    if exists is None:
+        conn.execute(text("CREATE VIRTUAL TABLE urls_fts USING fts5(short_code, host, path, owner)"))
+        conn.execute(text(f"INSERT INTO urls_fts(urls_fts, rank) VALUES ('rank', '{RANK_FUNCTION}')"))
+        conn.execute(text(INDEX_ROWS_SQL.format(source='SELECT id, url, short_code, owner_id FROM urls')))
+    for trigger in TRIGGERS:
+        conn.execute(text(trigger))
+
+
+def match_expression(query: str, owner_id: int):
+    """Build a MATCH clause for the caller's links, or None if query has no searchable terms.
+
+    Free text is reduced to word tokens and quoted, so FTS5 query syntax in the
+    input is never interpreted. Every term is a prefix match.
+    """
+    terms = TERM_PATTERN.findall(query.lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    phrases = ' '.join(f'"{term}"*' for term in terms)
+    return literal_column('urls_fts').match(f'owner:u{int(owner_id)} AND {{short_code host path}}: ({phrases})')
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+
+from sqlalchemy import select
+
+import config
+from database import engine
+from models import Urls
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip while loading codes
+LOAD_BATCH_SIZE = 10000
+
+
+class ShortCodeFilter:
+    """Counting Bloom filter over short codes so definite misses skip the database.
+
+    Counters are one byte each, which lets deletes decrement them. A counter that
+    saturates at 255 is never decremented again, which can only cause false positives.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float, sync_interval: float, enabled: bool = True):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.sync_interval = sync_interval
+        self.enabled = enabled
+        self.size = max(8, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._counters = bytearray(self.size) if enabled else bytearray()
+        self._lock = threading.Lock()
+        self.items = 0
+        self.high_water_id = 0
+        self.ready = False
+        self.definite_misses = 0
+        self.false_positives = 0
+
+    def _positions(self, short_code: str):
+        digest = hashlib.blake2b(short_code.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def _add(self, short_code: str):
+        counters = self._counters
+        for pos in self._positions(short_code):
+            if counters[pos] < 255:
+                counters[pos] += 1
+        self.items += 1
+
+    def add(self, short_code: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._add(short_code)
+
+    def remove(self, short_code: str, url_id: int):
+        # Only codes loaded by build/sync are known to be counted; removing anything
+        # else could zero another code's counters and turn it into a false negative.
+        if not self.enabled or url_id > self.high_water_id:
+            return
+        with self._lock:
+            positions = self._positions(short_code)
+            counters = self._counters
+            if not all(counters[pos] for pos in positions):
+                return
+            for pos in positions:
+                if counters[pos] < 255:
+                    counters[pos] -= 1
+            self.items -= 1
+
+    def might_contain(self, short_code: str) -> bool:
+        if not self.ready:
+            return True
+        counters = self._counters
+        if all(counters[pos] for pos in self._positions(short_code)):
+            return True
+        self.definite_misses += 1
+        return False
+
+    def record_false_positive(self):
+        self.false_positives += 1
+
+    def _load_since(self, last_id: int):
+        with engine.connect() as conn:
+            while True:
+                rows = conn.execute(
+                    select(Urls.id, Urls.short_code)
+                    .where(Urls.id > last_id)
+                    .order_by(Urls.id)
+                    .limit(LOAD_BATCH_SIZE)
+                ).all()
+                if not rows:
+                    return
+                with self._lock:
+                    for row in rows:
+                        self._add(row.short_code)
+                    last_id = rows[-1].id
+                    self.high_water_id = last_id
+
+    def build(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters = bytearray(self.size)
+            self.items = 0
+            self.high_water_id = 0
+        self._load_since(0)
+        self.ready = True
+
+    def sync(self):
+        # Pick up codes created by other workers since the last load
+        self._load_since(self.high_water_id)
+
+    async def run(self):
+        if not self.enabled:
+            return
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception:
+                logger.exception('short code filter sync failed')
+
+    def stats(self) -> dict:
+        fill = 1 - math.exp(-self.hashes * self.items / self.size) if self.enabled else 0.0
+        return {
+            'enabled': self.enabled,
+            'ready': self.ready,
+            'capacity': self.capacity,
+            'target_fp_rate': self.fp_rate,
+            'estimated_fp_rate': fill ** self.hashes,
+            'counters': self.size,
+            'hashes': self.hashes,
+            'memory_bytes': len(self._counters),
+            'items': self.items,
+            'definite_misses': self.definite_misses,
+            'false_positives': self.false_positives,
+        }
+
+
+short_code_filter = ShortCodeFilter(config.BLOOM_CAPACITY, config.BLOOM_FP_RATE,
+                                    config.BLOOM_SYNC_INTERVAL, config.BLOOM_ENABLED)
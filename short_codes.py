@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import hmac
+import threading
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from starlette.concurrency import run_in_threadpool
+
+import config
+from database import engine, select_in_chunks
+from models import CodeSequences, Urls
+
+BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+SEQUENCE_CODE_LENGTH = 7
+SEQUENCE_SPACE = 62 ** SEQUENCE_CODE_LENGTH
+# The Feistel network permutes 42-bit values (two 21-bit halves), just above 62**7
+FEISTEL_HALF_BITS = 21
+FEISTEL_HALF_MASK = (1 << FEISTEL_HALF_BITS) - 1
+FEISTEL_ROUNDS = 4
+SEQUENCE_NAME = 'short_code'
+
+
+def create_short_code(long_url: str, salt: str = '', length: int = 8) -> str:
+    # Include salt in the hash to avoid collision
+    input_str = long_url + salt
+    hash_object = hashlib.sha256(input_str.encode())
+    b64_encoded = base64.urlsafe_b64encode(hash_object.digest()).decode()
+    return b64_encoded[:length]
+
+
+def encode_base62(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 62)
+        chars.append(BASE62[remainder])
+    return ''.join(reversed(chars))
+
+
+def permute_sequence(value: int, secret: bytes) -> int:
+    """Map a sequence id onto [0, 62**7) with a keyed bijection.
+
+    A four-round Feistel network keyed with HMAC-SHA256 permutes 42-bit values; results
+    outside the code space are fed back in (cycle walking) until one lands inside, which
+    keeps the mapping a bijection on [0, 62**7). Without the secret, neighbouring ids give
+    unrelated codes, so issued codes cannot be used to enumerate the others.
+    """
+    while True:
+        left, right = value >> FEISTEL_HALF_BITS, value & FEISTEL_HALF_MASK
+        for round_number in range(FEISTEL_ROUNDS):
+            digest = hmac.new(secret, f'{round_number}:{right}'.encode(), hashlib.sha256).digest()
+            left, right = right, left ^ (int.from_bytes(digest[:4], 'big') & FEISTEL_HALF_MASK)
+        value = left << FEISTEL_HALF_BITS | right
+        if value < SEQUENCE_SPACE:
+            return value
+
+
+class HashCodeGenerator:
+    """Salted SHA-256 codes; every candidate batch is probed against the table."""
+
+    async def allocate(self, db, long_urls):
+        # Hash every URL, then re-salt only the codes that collide with the table or each other
+        codes = {long_url: create_short_code(long_url) for long_url in long_urls}
+        attempt = 1
+        pending = list(long_urls)
+        taken = set()
+        while pending:
+            candidates = [codes[long_url] for long_url in pending]
+            taken.update(row.short_code for row in await select_in_chunks(db, [Urls.short_code], Urls.short_code, candidates))
+            retry = []
+            for long_url in pending:
+                if codes[long_url] in taken:
+                    codes[long_url] = create_short_code(long_url, salt=str(attempt))
+                    retry.append(long_url)
+                else:
+                    taken.add(codes[long_url])
+            pending = retry
+            attempt += 1
+        return codes
+
+
+class SequenceCodeGenerator:
+    """Base62 codes from a shared counter, leased in blocks so no code needs a probe.
+
+    Each worker reserves block_size ids at a time with one atomic UPDATE ... RETURNING
+    on code_sequences, so workers never hand out the same id. Ids are turned into codes
+    with permute_sequence keyed by SHORT_CODE_SECRET. Sequence codes are always
+    7 characters and hash codes 8, so the two modes cannot collide.
+    """
+
+    def __init__(self, block_size: int, secret: str):
+        self.block_size = block_size
+        self.secret = secret.encode()
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+        self.leases = 0
+
+    def _lease(self, size: int):
+        with engine.begin() as conn:
+            conn.execute(
+                sqlite_insert(CodeSequences)
+                .values(name=SEQUENCE_NAME, next_value=1)
+                .on_conflict_do_nothing(index_elements=[CodeSequences.name])
+            )
+            end = conn.execute(
+                update(CodeSequences)
+                .where(CodeSequences.name == SEQUENCE_NAME)
+                .values(next_value=CodeSequences.next_value + size)
+                .returning(CodeSequences.next_value)
+            ).scalar_one()
+        self._next, self._end = end - size, end
+        self.leases += 1
+
+    def take(self, count: int) -> list:
+        with self._lock:
+            ids = []
+            while len(ids) < count:
+                if self._next >= self._end:
+                    self._lease(max(self.block_size, count - len(ids)))
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return [encode_base62(permute_sequence(value, self.secret), SEQUENCE_CODE_LENGTH) for value in ids]
+
+    async def allocate(self, db, long_urls):
+        codes = await run_in_threadpool(self.take, len(long_urls))
+        return dict(zip(long_urls, codes))
+
+
+def make_code_generator(mode: str):
+    if mode == 'hash':
+        return HashCodeGenerator()
+    if mode == 'sequence':
+        return SequenceCodeGenerator(config.SHORT_CODE_BLOCK_SIZE, config.SHORT_CODE_SECRET)
+    raise ValueError("SHORT_CODE_MODE must be 'hash' or 'sequence'")
+
+
+code_generator = make_code_generator(config.SHORT_CODE_MODE)
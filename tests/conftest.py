@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Point the app at a throwaway database before any project module reads config
+os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/test.db'
+os.environ.setdefault('SECRET_KEY', 'test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from sqlalchemy import delete, func, insert, select
+
+from click_log import ClickLog
+from database import engine
+from migrations import upgrade_schema
+from models import ClickEvents, ClickRollups, Urls
+
+EVENTS = 2500
+
+
+def setup_module():
+    upgrade_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(delete(ClickEvents))
+        conn.execute(delete(ClickRollups))
+        conn.execute(delete(Urls))
+        conn.execute(insert(Urls), [{'url': 'https://example.com/', 'short_code': 'clicklog', 'access_count': 0}])
+
+
+def count_events():
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(ClickEvents)).scalar()
+
+
+def test_stop_writes_every_queued_event():
+    # A flush interval far longer than the test: only the shutdown drain can write these
+    log = ClickLog(batch_size=100, flush_interval=3600, queue_size=EVENTS, overflow='block')
+
+    async def scenario():
+        log.start()
+        for i in range(EVENTS):
+            await log.publish('clicklog', None, f'agent-{i}', '203.0.113.7')
+        queued = log.stats()['queued']
+        await log.stop()
+        return queued
+
+    queued = asyncio.run(scenario())
+
+    assert queued == EVENTS
+    assert log.dropped == 0 and log.failed == 0
+    assert log.written == EVENTS
+    assert count_events() == EVENTS
+    with engine.connect() as conn:
+        hourly = conn.execute(select(func.sum(ClickRollups.clicks)).where(ClickRollups.granularity == 'hour')).scalar()
+    assert hourly == EVENTS
+
+
+def test_stop_does_not_wait_for_the_flush_interval():
+    # A full queue leaves no room for the wake-up sentinel
+    log = ClickLog(batch_size=5, flush_interval=30, queue_size=10, overflow='block')
+
+    async def scenario():
+        log.start()
+        for i in range(10):
+            await log.publish('clicklog', None, None, None)
+        started = time.monotonic()
+        await log.stop()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 5
+    assert log.written == 10
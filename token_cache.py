@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import config
+
+
+@lru_cache(maxsize=8)
+def key_fingerprint(secret_key: str, algorithm: str) -> bytes:
+    # Part of every cache key, so a token verified under an old key never hits after rotation
+    return hashlib.sha256(f'{algorithm}:{secret_key}'.encode()).digest()[:16]
+
+
+class TokenCache:
+    """Bounded LRU cache of verified JWT claims, keyed by a digest of the token.
+
+    Raw tokens are never stored. Each entry expires `margin` seconds before the
+    token's own exp, so a cached token is never honoured past its lifetime.
+    """
+
+    def __init__(self, maxsize: int, margin: float):
+        self.maxsize = maxsize
+        self.margin = margin
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(token: str, secret_key: str, algorithm: str) -> bytes:
+        return hashlib.sha256(key_fingerprint(secret_key, algorithm) + token.encode()).digest()
+
+    def get(self, token: str, secret_key: str, algorithm: str):
+        key = self._key(token, secret_key, algorithm)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, expires = entry
+            if expires <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return dict(claims)
+
+    def set(self, token: str, secret_key: str, algorithm: str, claims: dict, exp):
+        # Tokens without exp are verified on every request
+        if self.maxsize <= 0 or exp is None:
+            return
+        expires = float(exp) - self.margin
+        if expires <= time.time():
+            return
+        key = self._key(token, secret_key, algorithm)
+        with self._lock:
+            self._data[key] = (dict(claims), expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache(config.TOKEN_CACHE_SIZE, config.TOKEN_CACHE_EXPIRY_MARGIN)
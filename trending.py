@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+
+import config
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters summary: at most `capacity` counters, each an upper bound.
+
+    Keys are also grouped by count (the stream-summary layout), with the smallest count
+    tracked, so both incrementing and evicting the minimum are O(1).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._by_count = {}
+        self._min = 0
+
+    def _move(self, key: str, count: int):
+        # Counts only ever grow by one, so an emptied minimum group means the minimum is count + 1
+        group = self._by_count[count]
+        del group[key]
+        if not group:
+            del self._by_count[count]
+            if count == self._min:
+                self._min = count + 1
+        self._by_count.setdefault(count + 1, {})[key] = None
+
+    def add(self, key: str):
+        counts = self.counts
+        if key in counts:
+            self._move(key, counts[key])
+            counts[key] += 1
+        elif len(counts) < self.capacity:
+            counts[key] = 1
+            self.errors[key] = 0
+            self._by_count.setdefault(1, {})[key] = None
+            self._min = 1
+        else:
+            # Evict a smallest counter; the newcomer inherits its count as error
+            floor = self._min
+            group = self._by_count[floor]
+            victim = next(iter(group))
+            del group[victim]
+            del counts[victim]
+            del self.errors[victim]
+            group[key] = None
+            self._move(key, floor)
+            counts[key] = floor + 1
+            self.errors[key] = floor
+
+
+class TrendingLinks:
+    """Top-K short codes over a sliding window, kept as a ring of per-bucket Space-Saving summaries."""
+
+    def __init__(self, bucket_seconds: int, max_window_seconds: int, capacity: int):
+        self.bucket_seconds = bucket_seconds
+        self.max_buckets = max(1, max_window_seconds // bucket_seconds)
+        self.capacity = capacity
+        self._buckets = deque()
+        self._lock = threading.Lock()
+        self._results = {}
+
+    def _current_bucket(self, now: float):
+        index = int(now // self.bucket_seconds)
+        if not self._buckets or self._buckets[-1][0] != index:
+            self._buckets.append((index, SpaceSaving(self.capacity)))
+            while self._buckets and self._buckets[0][0] <= index - self.max_buckets:
+                self._buckets.popleft()
+        return self._buckets[-1][1]
+
+    def record(self, short_code: str):
+        with self._lock:
+            self._current_bucket(time.time()).add(short_code)
+
+    def top(self, window_seconds: int, k: int) -> list:
+        now = time.time()
+        index = int(now // self.bucket_seconds)
+        buckets_in_window = max(1, -(-window_seconds // self.bucket_seconds))
+        key = (buckets_in_window, k)
+        with self._lock:
+            # Merge at most once per bucket; until the next bucket opens reads are a dict lookup
+            cached = self._results.get(key)
+            if cached is not None and cached[0] == index:
+                return cached[1]
+            counts = {}
+            errors = {}
+            for bucket_index, summary in self._buckets:
+                if bucket_index <= index - buckets_in_window:
+                    continue
+                for code, count in summary.counts.items():
+                    counts[code] = counts.get(code, 0) + count
+                    errors[code] = errors.get(code, 0) + summary.errors[code]
+            ranked = sorted(counts, key=counts.get, reverse=True)[:k]
+            result = [{'short_code': code, 'clicks': counts[code], 'error': errors[code]} for code in ranked]
+            self._results = {cached_key: value for cached_key, value in self._results.items() if value[0] == index}
+            self._results[key] = (index, result)
+            return result
+
+
+def parse_window(window: str) -> int:
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if len(window) < 2 or window[-1] not in units or not window[:-1].isdigit():
+        raise ValueError('window must look like 30s, 5m or 1h')
+    return int(window[:-1]) * units[window[-1]]
+
+
+trending_links = TrendingLinks(config.TRENDING_BUCKET_SECONDS, config.TRENDING_MAX_WINDOW_SECONDS,
+                               config.TRENDING_CAPACITY)
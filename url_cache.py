@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import delete, func, select, text
+
+import config
+from database import engine
+from models import UrlChanges
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip while reading the change feed
+CHANGE_BATCH_SIZE = 1000
+
+# Every change to a link's target, and every delete, lands in url_changes
+CHANGE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS urls_changes_update AFTER UPDATE OF url, short_code ON urls BEGIN
+        INSERT INTO url_changes(short_code) VALUES (old.short_code);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS urls_changes_delete AFTER DELETE ON urls BEGIN
+        INSERT INTO url_changes(short_code) VALUES (old.short_code);
+    END""",
+]
+
+
+def create_change_triggers(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    for trigger in CHANGE_TRIGGERS:
+        conn.execute(text(trigger))
+
+
+class UrlCache:
+    """Bounded LRU cache of short_code -> long URL with a per-entry TTL.
+
+    Every invalidation bumps `generation`. A caller that read the database before an
+    invalidation passes the generation it saw to `set`, which then drops the value
+    instead of caching a target that may already be stale.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.generation = 0
+        self.stale_sets = 0
+
+    def get(self, short_code: str):
+        with self._lock:
+            entry = self._data.get(short_code)
+            if entry is None:
+                self.misses += 1
+                return None
+            url, expires = entry
+            if expires < time.monotonic():
+                del self._data[short_code]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(short_code)
+            self.hits += 1
+            return url
+
+    def set(self, short_code: str, url: str, generation: int | None = None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_sets += 1
+                return
+            self._data[short_code] = (url, time.monotonic() + self.ttl)
+            self._data.move_to_end(short_code)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *short_codes: str):
+        with self._lock:
+            self.generation += 1
+            for short_code in short_codes:
+                self._data.pop(short_code, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'stale_sets': self.stale_sets,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class UrlChangeFeed:
+    """Drops cache entries for links changed or deleted by any worker.
+
+    Triggers append the old short code to url_changes on every target change and
+    delete. Its ids only grow, so each worker reads the rows past the last id it saw,
+    the same way the short code filter syncs. Rows older than `retention` are pruned.
+    """
+
+    def __init__(self, cache: UrlCache, sync_interval: float, retention: int):
+        self.cache = cache
+        self.sync_interval = sync_interval
+        self.retention = retention
+        self.high_water_id = 0
+        self.invalidations = 0
+        self._last_prune = 0.0
+
+    def start(self):
+        # Changes made before this worker started cannot be in its cache
+        with engine.connect() as conn:
+            self.high_water_id = conn.execute(select(func.max(UrlChanges.id))).scalar() or 0
+        self.cache.clear()
+
+    def sync(self):
+        with engine.connect() as conn:
+            while True:
+                rows = conn.execute(
+                    select(UrlChanges.id, UrlChanges.short_code)
+                    .where(UrlChanges.id > self.high_water_id)
+                    .order_by(UrlChanges.id)
+                    .limit(CHANGE_BATCH_SIZE)
+                ).all()
+                if not rows:
+                    break
+                self.cache.invalidate(*{row.short_code for row in rows})
+                self.invalidations += len(rows)
+                self.high_water_id = rows[-1].id
+        now = time.monotonic()
+        if now - self._last_prune >= self.retention / 60:
+            self._last_prune = now
+            with engine.begin() as conn:
+                conn.execute(delete(UrlChanges).where(
+                    UrlChanges.changed_at < func.datetime('now', f'-{self.retention} seconds')))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception:
+                logger.exception('url cache sync failed')
+
+    def stats(self) -> dict:
+        return {
+            'sync_interval': self.sync_interval,
+            'high_water_id': self.high_water_id,
+            'invalidations': self.invalidations,
+        }
+
+
+url_cache = UrlCache(config.URL_CACHE_SIZE, config.URL_CACHE_TTL)
+url_change_feed = UrlChangeFeed(url_cache, config.URL_CACHE_SYNC_INTERVAL, config.URL_CHANGE_RETENTION)
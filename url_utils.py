@@ -0,0 +1,36 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(long_url: str) -> str:
+    """Canonical form used for dedupe: lower-case scheme and host, no default port.
+
+    The fragment is kept: single-page apps route on it, so `#/a` and `#/b` are
+    different destinations.
+    """
+    long_url = long_url.strip()
+    try:
+        parts = urlsplit(long_url)
+        port = parts.port
+    except ValueError:
+        return long_url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if not scheme or not host:
+        return long_url
+    netloc = host
+    if parts.username or parts.password:
+        userinfo = parts.username or ''
+        if parts.password:
+            userinfo += ':' + parts.password
+        netloc = f'{userinfo}@{host}'
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += f':{port}'
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, parts.fragment))
+
+
+def hash_url(long_url: str) -> str:
+    # Fixed-width key for the (owner_id, url_hash) dedupe index
+    return hashlib.sha256(normalize_url(long_url).encode()).hexdigest()[:32]
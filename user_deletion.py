@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import secrets
+
+from sqlalchemy import delete, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+import config
+from api_keys import api_key_cache
+from bulk_ops import delete_url_rows, forget_url_rows
+from database import IN_CHUNK_SIZE, engine
+from models import ApiKeys, DeletionJobs, Urls, Users
+
+logger = logging.getLogger(__name__)
+
+JOB_FIELDS = ('user_id', 'status', 'total_urls', 'deleted_urls', 'chunks', 'started_at', 'finished_at', 'error')
+
+
+class UserDeletionJobs:
+    """Deletes users and everything they own from a background task, one short transaction per chunk.
+
+    The first transaction deactivates the user and removes their API keys, then links and
+    their click analytics go `chunk_size` at a time with a `pause` between chunks so click
+    writers get the SQLite write lock in between. The user row goes last, and only once they
+    own no links. Jobs live in the deletion_jobs table, so every worker reports the same
+    progress and a user has at most one unfinished job; the newest `max_jobs` finished jobs
+    are kept. A job not updated for `stale_after` seconds lost its worker and is replaced.
+    """
+
+    def __init__(self, chunk_size: int, pause: float, max_jobs: int, stale_after: float):
+        self.chunk_size = max(1, min(chunk_size, IN_CHUNK_SIZE))
+        self.pause = pause
+        self.max_jobs = max_jobs
+        self.stale_after = stale_after
+        self._tasks = set()
+        self.completed = 0
+        self.failed = 0
+        self.deleted_urls = 0
+
+    async def start(self, user_id: int) -> dict:
+        """Schedule deletion of user_id, or return the unfinished job already deleting it."""
+        job, created = await asyncio.to_thread(self.claim, user_id)
+        if created:
+            task = asyncio.create_task(self._run(job['job_id'], user_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return job
+
+    def claim(self, user_id: int):
+        # The partial unique index on user_id lets only one worker insert an unfinished job
+        while True:
+            job_id = secrets.token_hex(8)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        update(DeletionJobs)
+                        .where(DeletionJobs.user_id == user_id, DeletionJobs.finished_at.is_(None),
+                               DeletionJobs.updated_at < func.datetime('now', f'-{self.stale_after} seconds'))
+                        .values(status='interrupted', finished_at=func.now())
+                    )
+                    conn.execute(insert(DeletionJobs).values(id=job_id, user_id=user_id, status='pending'))
+                return self.get(job_id), True
+            except IntegrityError:
+                with engine.connect() as conn:
+                    row = conn.execute(select(DeletionJobs.id).where(DeletionJobs.user_id == user_id,
+                                                                     DeletionJobs.finished_at.is_(None))).first()
+                # None: that job finished in between, so try again
+                if row is not None:
+                    return self.get(row.id), False
+
+    def get(self, job_id: str):
+        with engine.connect() as conn:
+            row = conn.execute(select(DeletionJobs).where(DeletionJobs.id == job_id)).first()
+        if row is None:
+            return None
+        return {'job_id': row.id, **{field: getattr(row, field) for field in JOB_FIELDS}}
+
+    def _update(self, job_id: str, **fields):
+        with engine.begin() as conn:
+            conn.execute(update(DeletionJobs).where(DeletionJobs.id == job_id).values(**fields, updated_at=func.now()))
+
+    def _finish(self, job_id: str, status: str, error=None):
+        finished = select(DeletionJobs.id).where(DeletionJobs.finished_at.is_not(None))
+        with engine.begin() as conn:
+            conn.execute(update(DeletionJobs).where(DeletionJobs.id == job_id)
+                         .values(status=status, error=error, finished_at=func.now(), updated_at=func.now()))
+            # Forget the oldest finished jobs; unfinished ones are always kept
+            conn.execute(delete(DeletionJobs).where(
+                DeletionJobs.id.in_(finished.order_by(DeletionJobs.finished_at.desc()).offset(self.max_jobs))
+            ))
+
+    def begin(self, user_id: int):
+        # Lock the account out first: API keys stop working and the user reads as inactive
+        with engine.begin() as conn:
+            total = conn.execute(select(func.count(Urls.id)).where(Urls.owner_id == user_id)).scalar()
+            conn.execute(update(Users).where(Users.id == user_id).values(is_active=False))
+            prefixes = conn.execute(
+                delete(ApiKeys).where(ApiKeys.user_id == user_id).returning(ApiKeys.prefix)
+            ).scalars().all()
+        api_key_cache.invalidate(*prefixes)
+        return total
+
+    def delete_chunk(self, user_id: int) -> int:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                # No ORDER BY: any chunk will do, and the owner_id index stops after chunk_size rows
+                select(Urls.id, Urls.short_code).where(Urls.owner_id == user_id).limit(self.chunk_size)
+            ).all()
+            if not rows:
+                return 0
+            delete_url_rows(conn, rows)
+        forget_url_rows(rows)
+        return len(rows)
+
+    def delete_user(self, user_id: int) -> bool:
+        """Delete the user row unless they own links again; True once the user is gone."""
+        with engine.begin() as conn:
+            conn.execute(delete(Users).where(Users.id == user_id, ~exists().where(Urls.owner_id == user_id)))
+            if conn.execute(select(Users.id).where(Users.id == user_id)).first() is not None:
+                return False
+            prefixes = conn.execute(
+                delete(ApiKeys).where(ApiKeys.user_id == user_id).returning(ApiKeys.prefix)
+            ).scalars().all()
+        api_key_cache.invalidate(*prefixes)
+        return True
+
+    async def _run(self, job_id: str, user_id: int):
+        try:
+            total = await asyncio.to_thread(self.begin, user_id)
+            await asyncio.to_thread(self._update, job_id, status='running', total_urls=total)
+            deleted = chunks = 0
+            while True:
+                count = await asyncio.to_thread(self.delete_chunk, user_id)
+                if count:
+                    deleted += count
+                    chunks += 1
+                    self.deleted_urls += count
+                    await asyncio.to_thread(self._update, job_id, deleted_urls=deleted, chunks=chunks)
+                    await asyncio.sleep(self.pause)
+                # A link created since the last chunk keeps the user; go round again
+                elif await asyncio.to_thread(self.delete_user, user_id):
+                    break
+        except asyncio.CancelledError:
+            # Shutdown mid-job; deleting the user again picks up where this stopped
+            self._finish(job_id, 'interrupted')
+            raise
+        except Exception as exc:
+            logger.exception('deleting user %s failed', user_id)
+            self.failed += 1
+            await asyncio.to_thread(self._finish, job_id, 'failed', str(exc))
+        else:
+            self.completed += 1
+            await asyncio.to_thread(self._finish, job_id, 'completed')
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'running': len(self._tasks),
+            'completed': self.completed,
+            'failed': self.failed,
+            'deleted_urls': self.deleted_urls,
+        }
+
+
+user_deletions = UserDeletionJobs(config.USER_DELETE_CHUNK_SIZE, config.USER_DELETE_CHUNK_PAUSE,
+                                  config.USER_DELETE_MAX_JOBS, config.USER_DELETE_STALE_AFTER)